@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the HTML escaping done by JocumentStyle.escape_text
+
+Compares, on 10^5 random entries, the escaping applied when footnotes are
+first rendered against :code:`html.escape` and a :code:`str.translate`
+table, and shows the cost of adding, referencing and outputting footnotes
+with and without escaping.
+
+Run with::
+
+    python benchmarks/escape.py
+"""
+import html
+import random
+import string
+import timeit
+
+from jocument import Footnotes, JocumentStyle
+
+ENTRIES = 100000
+TRANSLATE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;',
+                                 '"': '&quot;', "'": '&#x27;'})
+
+
+def make_texts(alphabet: str, length: int = 80, seed: int = 1):
+    ''' Random footnote texts drawn from alphabet '''
+    rnd = random.Random(seed)
+    return [''.join(rnd.choice(alphabet) for _ in range(length))
+            for _ in range(ENTRIES)]
+
+
+def best_of(function, repeat: int = 3) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def add_all(styler: JocumentStyle, texts):
+    ''' Footnotes holding texts, each referenced once '''
+    footnotes = Footnotes(styler)
+    for index, text in enumerate(texts):
+        footnotes.add(str(index), text)
+        footnotes.ref(str(index))
+    return footnotes
+
+
+def main():
+    styler = JocumentStyle(escape=True)
+    corpora = {'plain': make_texts(string.ascii_letters + ' '),
+               'special': make_texts(string.ascii_letters + ' &<>"\'')}
+    print(f'{ENTRIES} entries of 80 characters, best of 3 (seconds)')
+    for corpus, texts in corpora.items():
+        assert [styler.escape_text(text) for text in texts] == [html.escape(text) for text in texts]
+        timings = {
+            'escape_text': best_of(lambda: [styler.escape_text(text) for text in texts]),
+            'html.escape': best_of(lambda: [html.escape(text) for text in texts]),
+            'str.translate': best_of(lambda: [text.translate(TRANSLATE_TABLE) for text in texts]),
+            'add and ref (no escaping)': best_of(lambda: add_all(JocumentStyle(), texts)),
+            'add and ref (escaping)': best_of(lambda: add_all(styler, texts)),
+        }
+        footnotes = add_all(styler, texts)
+        timings['output (escaped once)'] = best_of(footnotes.output)
+        for name, seconds in timings.items():
+            print(f'{corpus:8} {name:26} {seconds:8.4f}')
+
+
+if __name__ == '__main__':
+    main()
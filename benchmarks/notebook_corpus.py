@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Synthetic notebooks for benchmarking the stripper
+
+Each notebook alternates markdown cells with code cells whose outputs are
+embedded PNG images, DataFrame style HTML tables or plain text, in the
+proportions given.  The content is random but reproducible from the seed.
+
+Run with::
+
+    python benchmarks/notebook_corpus.py output_directory --cells 200 --images 20
+
+to write a notebook to disk, or import :py:func:`make_notebook`.
+"""
+import argparse
+import base64
+import os
+import random
+import string
+
+import nbformat
+from nbformat import v4
+
+# The 8 byte PNG signature so that the images at least look like PNGs
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _words(rnd: random.Random, characters: int) -> str:
+    words = []
+    length = 0
+    while length < characters:
+        word = ''.join(rnd.choice(string.ascii_lowercase)
+                       for _ in range(rnd.randint(2, 10)))
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def _markdown(rnd: random.Random, characters: int) -> str:
+    paragraphs = []
+    while characters > 0:
+        size = min(characters, rnd.randint(200, 800))
+        paragraphs.append(_words(rnd, size))
+        characters -= size
+    return '## ' + _words(rnd, 30) + '\n\n' + '\n\n'.join(paragraphs)
+
+
+def _image_output(rnd: random.Random, image_bytes: int):
+    data = PNG_SIGNATURE + bytes(rnd.getrandbits(8) for _ in range(image_bytes))
+    return v4.new_output('display_data',
+                         data={'image/png': base64.b64encode(data).decode('ascii'),
+                               'text/plain': '<Figure size 640x480 with 1 Axes>'})
+
+
+def _dataframe_output(rnd: random.Random, rows: int, columns: int):
+    header = ''.join(f'<th>col_{column}</th>' for column in range(columns))
+    body = ''.join('<tr><th>{}</th>{}</tr>'.format(
+        row, ''.join(f'<td>{rnd.random():.6f}</td>' for _ in range(columns)))
+                   for row in range(rows))
+    table = (f'<div><table border="1" class="dataframe"><thead><tr><th></th>{header}'
+             f'</tr></thead><tbody>{body}</tbody></table></div>')
+    return v4.new_output('execute_result', execution_count=1,
+                         data={'text/html': table,
+                               'text/plain': f'[{rows} rows x {columns} columns]'})
+
+
+def make_notebook(cells: int = 100, markdown_chars: int = 1000, images: int = 10,
+                  image_bytes: int = 20000, dataframes: int = 10,
+                  dataframe_rows: int = 50, dataframe_columns: int = 8,
+                  seed: int = 0):
+    ''' Make a synthetic notebook.
+
+    Args:
+        cells: The total number of cells.  Half are markdown.
+        markdown_chars: The size of each markdown cell
+        images: The number of code cells with an embedded PNG output
+        image_bytes: The size of each (random) PNG before base64 encoding
+        dataframes: The number of code cells with a DataFrame HTML output
+        dataframe_rows: The rows in each DataFrame
+        dataframe_columns: The columns in each DataFrame
+        seed: The random seed
+
+    Returns:
+        An nbformat version 4 notebook node
+    '''
+    rnd = random.Random(seed)
+    code_cells = cells - cells // 2
+    outputs = (['image'] * min(images, code_cells)
+               + ['dataframe'] * min(dataframes, max(code_cells - images, 0)))
+    outputs += ['text'] * (code_cells - len(outputs))
+    rnd.shuffle(outputs)
+    notebook = v4.new_notebook()
+    for index in range(cells):
+        if index % 2 == 0:
+            notebook.cells.append(v4.new_markdown_cell(_markdown(rnd, markdown_chars)))
+            continue
+        kind = outputs.pop()
+        cell = v4.new_code_cell(f'result_{index} = compute({index})', execution_count=index)
+        if kind == 'image':
+            cell.outputs.append(_image_output(rnd, image_bytes))
+        elif kind == 'dataframe':
+            cell.outputs.append(_dataframe_output(rnd, dataframe_rows, dataframe_columns))
+        else:
+            cell.outputs.append(v4.new_output('stream', name='stdout',
+                                              text=_words(rnd, 80) + '\n'))
+        notebook.cells.append(cell)
+    return notebook
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic notebook')
+    parser.add_argument('output_directory')
+    parser.add_argument('--cells', type=int, default=100)
+    parser.add_argument('--markdown-chars', type=int, default=1000)
+    parser.add_argument('--images', type=int, default=10)
+    parser.add_argument('--image-bytes', type=int, default=20000)
+    parser.add_argument('--dataframes', type=int, default=10)
+    parser.add_argument('--dataframe-rows', type=int, default=50)
+    parser.add_argument('--count', type=int, default=1, help='number of notebooks')
+    args = parser.parse_args()
+    os.makedirs(args.output_directory, exist_ok=True)
+    for seed in range(args.count):
+        notebook = make_notebook(args.cells, args.markdown_chars, args.images,
+                                 args.image_bytes, args.dataframes,
+                                 args.dataframe_rows, seed=seed)
+        path = os.path.join(args.output_directory, f'synthetic_{seed:04d}.ipynb')
+        nbformat.write(notebook, path)
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
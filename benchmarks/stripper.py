@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Headless benchmark of the notebook stripper
+
+Generates synthetic notebooks with :py:mod:`notebook_corpus`, converts each
+one with :py:func:`jocument.stripper.convert_notebook` and reports the
+throughput in cells and MB of notebook per second, the time of each stage
+and the peak memory.
+
+Run with::
+
+    python benchmarks/stripper.py
+    python benchmarks/stripper.py --json results.json
+
+Compare the output before and after a change to the parser, streaming or
+caching of the stripper.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import nbformat
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from notebook_corpus import make_notebook  # noqa: E402 pylint: disable=wrong-import-position
+
+from jocument import stripper  # noqa: E402 pylint: disable=wrong-import-position
+from jocument.instrumentation import StageMetrics  # noqa: E402 pylint: disable=wrong-import-position
+
+# name: make_notebook arguments
+CASES = {
+    'small text': dict(cells=20, markdown_chars=500, images=0, dataframes=0),
+    'long text': dict(cells=500, markdown_chars=2000, images=0, dataframes=0),
+    'many images': dict(cells=100, images=50, image_bytes=50000, dataframes=0),
+    'many dataframes': dict(cells=100, images=0, dataframes=50, dataframe_rows=200),
+    'mixed report': dict(cells=300, markdown_chars=1500, images=30, dataframes=30),
+}
+
+
+def run_case(directory: str, name: str, arguments: dict, repeat: int) -> dict:
+    ''' Convert the notebook for one case repeat times and keep the fastest.
+        The peak memory comes from one more run with tracemalloc, which is
+        too slow to leave on while timing.
+    '''
+    path = os.path.join(directory, name.replace(' ', '_') + '.ipynb')
+    notebook = make_notebook(**arguments)
+    nbformat.write(notebook, path)
+    size = os.path.getsize(path)
+    best = None
+    for _ in range(repeat):
+        metrics = StageMetrics(logging.getLogger('benchmark'))
+        start = time.perf_counter()
+        html = stripper.convert_notebook(path, metrics)
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best['seconds']:
+            best = {'case': name,
+                    'cells': len(notebook.cells),
+                    'notebook_bytes': size,
+                    'output_bytes': len(html.encode('utf-8')),
+                    'seconds': seconds,
+                    'cells_per_second': len(notebook.cells) / seconds,
+                    'mb_per_second': size / seconds / 1e6,
+                    'stages': {stage['stage']: stage['seconds']
+                               for stage in metrics.stages}}
+    tracemalloc.start()
+    stripper.convert_notebook(path, StageMetrics(logging.getLogger('benchmark')))
+    best['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the notebook stripper')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--case', action='append', choices=sorted(CASES),
+                        help='run only these cases')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.case or CASES:
+            results.append(run_case(directory, name, CASES[name], args.repeat))
+    print(f'{"case":16} {"cells":>6} {"MB in":>7} {"MB out":>7} {"s":>7} '
+          f'{"cells/s":>8} {"MB/s":>6} {"peak MB":>8}')
+    for result in results:
+        print(f'{result["case"]:16} {result["cells"]:6d} '
+              f'{result["notebook_bytes"] / 1e6:7.2f} {result["output_bytes"] / 1e6:7.2f} '
+              f'{result["seconds"]:7.3f} {result["cells_per_second"]:8.0f} '
+              f'{result["mb_per_second"]:6.2f} {result["peak_memory_bytes"] / 1e6:8.1f}')
+        print(' ' * 17 + '  '.join(f'{stage} {seconds:.3f}s'
+                                   for stage, seconds in result['stages'].items()))
+    if args.json:
+        with open(args.json, 'wt') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
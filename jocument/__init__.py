@@ -4,7 +4,14 @@
 """
 
 
-from jocument.references import Labels, Citations, Footnotes, JocumentStyle
+from jocument.references import Labels, Citations, Footnotes, JocumentStyle, merge_usage, \
+    LabelRegistry
 from jocument.styling import CenterOutput
+from jocument.book import BookRegistry
+from jocument.targets import LatexStyle, MarkdownStyle
+from jocument.sections import SECTIONS
+import jocument.completion # Registers the IPython completer
 
-__all__ = ['Footnotes', 'Citations', 'Labels', 'CenterOutput', 'JocumentStyle']
+__all__ = ['Footnotes', 'Citations', 'Labels', 'CenterOutput', 'JocumentStyle',
+           'merge_usage', 'BookRegistry', 'LabelRegistry', 'LatexStyle', 'MarkdownStyle',
+           'SECTIONS']
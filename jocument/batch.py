@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Batch documentation
+
+Convert many notebooks at once with an asyncio pipeline.  Reading the
+notebooks, converting them and writing the HTML are separate stages joined
+by bounded queues, so while one notebook is being converted others are
+being read and written.  This hides the latency of network file systems
+when republishing a large tree of notebooks.
+
+Run with::
+
+    python -m jocument.batch notebooks published --concurrency 8
+
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import os
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import nbformat
+
+from jocument.instrumentation import StageMetrics
+from jocument.stripper import notebook_to_html, strip_html, write_html
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the jobs in a queue
+_DONE = None
+
+
+class BatchResult(NamedTuple):
+    ''' The outcome of converting one notebook '''
+    notebook_path: str
+    output_path: str
+    error: Optional[str]
+
+
+def _read(notebook_path: str) -> str:
+    with open(notebook_path, 'rt', encoding='utf-8') as input_file:
+        return input_file.read()
+
+
+def _convert(notebook_text: str, compact: bool) -> str:
+    ''' The CPU bound part, run in the executor so it must be picklable.
+
+        The stage metrics aren't wanted here, so memory isn't traced.
+    '''
+    metrics = StageMetrics(logger, trace_memory=False)
+    notebook = nbformat.reads(notebook_text, as_version=4)
+    return strip_html(notebook_to_html(notebook, metrics), metrics, compact)
+
+
+def _write(output_path: str, stripped_html: str, precompress: Sequence[str]) -> None:
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    write_html(output_path, stripped_html, precompress)
+
+
+async def convert_notebooks(jobs: Iterable[Tuple[str, str]], concurrency: int = 4,
+                            executor: concurrent.futures.Executor = None,
+                            compact: bool = False,
+                            precompress: Sequence[str] = ()) -> List[BatchResult]:
+    ''' Convert notebooks to stripped HTML files.
+
+    There are :code:`concurrency` readers, converters and writers.  The
+    queues between them hold at most :code:`concurrency` notebooks so
+    that the readers wait when conversion falls behind, and memory stays
+    bounded however many jobs there are.  Reading and writing run in the
+    default thread pool executor of the event loop.
+
+    Args:
+        jobs: Pairs of (notebook path, output HTML path)
+        concurrency: The number of notebooks in each stage at once
+        executor: Where the conversions run.  Defaults to a process pool
+            with :code:`concurrency` workers.
+        compact: Passed to :py:func:`jocument.stripper.strip_html`
+        precompress: Passed to :py:func:`jocument.stripper.write_html`
+
+    Returns:
+        A :py:class:`BatchResult` for each job, in the order they finished
+    '''
+    loop = asyncio.get_running_loop()
+    job_queue: asyncio.Queue = asyncio.Queue()
+    convert_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    results: List[BatchResult] = []
+    for job in jobs:
+        job_queue.put_nowait(job)
+    for _ in range(concurrency):
+        job_queue.put_nowait(_DONE)
+
+    async def reader():
+        while True:
+            job = await job_queue.get()
+            if job is _DONE:
+                await convert_queue.put(_DONE)
+                return
+            try:
+                text = await loop.run_in_executor(None, _read, job[0])
+            except (OSError, ValueError) as error:
+                results.append(BatchResult(job[0], job[1], repr(error)))
+                continue
+            await convert_queue.put((job, text))
+
+    async def converter():
+        while True:
+            item = await convert_queue.get()
+            if item is _DONE:
+                await write_queue.put(_DONE)
+                return
+            job, text = item
+            try:
+                stripped_html = await loop.run_in_executor(cpu_executor, _convert,
+                                                           text, compact)
+            except Exception as error: #pylint: disable=broad-except
+                results.append(BatchResult(job[0], job[1], repr(error)))
+                continue
+            await write_queue.put((job, stripped_html))
+
+    async def writer():
+        while True:
+            item = await write_queue.get()
+            if item is _DONE:
+                return
+            job, stripped_html = item
+            try:
+                await loop.run_in_executor(None, _write, job[1], stripped_html,
+                                           precompress)
+                results.append(BatchResult(job[0], job[1], None))
+                logger.info('Wrote %s', job[1])
+            except OSError as error:
+                results.append(BatchResult(job[0], job[1], repr(error)))
+
+    cpu_executor = executor
+    if cpu_executor is None:
+        cpu_executor = concurrent.futures.ProcessPoolExecutor(max_workers=concurrency)
+    try:
+        await asyncio.gather(*([reader() for _ in range(concurrency)]
+                               + [converter() for _ in range(concurrency)]
+                               + [writer() for _ in range(concurrency)]))
+    finally:
+        if executor is None:
+            cpu_executor.shutdown()
+    return results
+
+
+def convert_directory(directory: str, output_directory: str, **kwargs) -> List[BatchResult]:
+    ''' Convert every notebook under directory, mirroring the layout in
+        output_directory.  Keyword arguments are passed on to
+        :py:func:`convert_notebooks`.
+    '''
+    jobs = []
+    for root, directories, files in os.walk(directory):
+        directories[:] = [name for name in directories if name != '.ipynb_checkpoints']
+        for name in sorted(files):
+            if name.endswith('.ipynb'):
+                notebook_path = os.path.join(root, name)
+                relative_path = os.path.relpath(notebook_path, directory)
+                jobs.append((notebook_path,
+                             os.path.join(output_directory,
+                                          os.path.splitext(relative_path)[0] + '.html')))
+    return asyncio.run(convert_notebooks(jobs, **kwargs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a directory of notebooks')
+    parser.add_argument('directory')
+    parser.add_argument('output_directory')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--compact', action='store_true')
+    parser.add_argument('--precompress', nargs='*', default=(), choices=['gz', 'br'])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    results = convert_directory(args.directory, args.output_directory,
+                                concurrency=args.concurrency, compact=args.compact,
+                                precompress=args.precompress)
+    for result in results:
+        if result.error is not None:
+            logger.error('%s: %s', result.notebook_path, result.error)
+    return 1 if any(result.error is not None for result in results) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""Book documentation
+
+A book is a sequence of notebooks which should share one continuous
+numbering of footnotes, citations and labels.  The :py:class:`BookRegistry`
+records the references made by each notebook in a JSON file so that only
+the notebooks which have changed need to be read again when the numbering
+is rebuilt.
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Tuple
+
+# Calls such as {{citations.cite('name')}} or figures.add("name", ...)
+_CALL_RE = re.compile(r'''\b([A-Za-z_]\w*)\.(ref|num|cite|add|reference)\(\s*(['"])(.*?)\3''')
+
+# Substrings which a source must contain for _CALL_RE to match.  Checking
+# for them first is much quicker than running the regular expression on
+# the many cells with no calls.
+_CALL_MARKERS = ('.ref(', '.num(', '.cite(', '.add(', '.reference(')
+
+# Constructors such as footnotes = Footnotes() or figures = jocument.Labels('Figure')
+_CONSTRUCTOR_RE = re.compile(r'''\b([A-Za-z_]\w*)\s*=\s*(?:jocument\.)?(Footnotes|Citations|Labels)\(''')
+_CONSTRUCTOR_MARKERS = ('Footnotes(', 'Citations(', 'Labels(')
+
+# The methods which give a name its number for each type of container
+_NUMBERING_METHODS = {'Footnotes': ('ref', 'num'),
+                      'Citations': ('cite',),
+                      'Labels': ('add',)}
+
+
+def _digest(path: str) -> str:
+    ''' The sha256 hex digest of the contents of a file '''
+    sha = hashlib.sha256()
+    with open(path, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _cell_sources(notebook: Dict) -> Iterable[Tuple[str, str]]:
+    ''' The (cell type, source) of each cell in a version 4 notebook '''
+    for cell in notebook.get('cells', []):
+        source = cell.get('source', '')
+        if isinstance(source, list):
+            source = ''.join(source)
+        yield cell.get('cell_type', ''), source
+
+
+def scan_notebook(path: str) -> Dict:
+    ''' Find the reference containers and the calls made on them in a notebook.
+
+    The notebook is read as JSON and is not executed so this only sees calls
+    with a literal name, for example :code:`{{footnotes.ref('a_note')}}` in
+    markdown or :code:`figures.add('a_chart', title='Title')` in code.
+
+    Args:
+        path: The path to the .ipynb file
+
+    Returns:
+        A dictionary with the keys :code:`types`, mapping variable names to
+        the container class constructed in the notebook, and :code:`calls`,
+        mapping variable names to a list of :code:`[method, name]` in the
+        order they appear in the notebook.
+    '''
+    with open(path, 'rt', encoding='utf-8') as input_file:
+        notebook = json.load(input_file)
+    return _scan_sources(notebook)
+
+
+def _scan_sources(notebook: Dict) -> Dict:
+    ''' :py:func:`scan_notebook` for a notebook already read '''
+    types: Dict = {}
+    calls: Dict = {}
+    seen = set()
+    for _, source in _cell_sources(notebook):
+        if any(marker in source for marker in _CONSTRUCTOR_MARKERS):
+            for match in _CONSTRUCTOR_RE.finditer(source):
+                types[match.group(1)] = match.group(2)
+        if not any(marker in source for marker in _CALL_MARKERS):
+            continue
+        for match in _CALL_RE.finditer(source):
+            call = (match.group(1), match.group(2), match.group(4))
+            if call not in seen:
+                seen.add(call)
+                calls.setdefault(call[0], []).append([call[1], call[2]])
+    return {'types': types, 'calls': calls}
+
+
+def container_type(records: Iterable[Dict], variable: str) -> str:
+    ''' The container class of a variable in some scanned notebooks.
+
+    Falls back on the methods called on it if no notebook constructs it.
+
+    Args:
+        records: Dictionaries as returned by :py:func:`scan_notebook`
+        variable: The name of the variable holding the container
+    '''
+    methods = set()
+    for record in records:
+        if variable in record['types']:
+            return record['types'][variable]
+        methods.update(method for method, _ in record['calls'].get(variable, []))
+    if methods & {'cite', 'reference'}:
+        return 'Citations'
+    if 'num' in methods:
+        return 'Footnotes'
+    return 'Labels'
+
+
+class BookRegistry():
+    ''' A registry of the references made by every notebook in a book.
+
+        Usage is as follows::
+
+            registry = BookRegistry('book_references.json')
+            registry.update(['chapter1.ipynb', 'chapter2.ipynb', 'chapter3.ipynb'])
+
+        and then in each chapter, after creating the containers::
+
+            citations.load_usage(registry.usage('citations'))
+
+        so that :code:`citations.cite` uses the numbering of the whole book.
+        The registry only holds the names, so :code:`citations.output()`
+        lists the citations defined in the chapter, with their book wide
+        numbers.
+
+        The registry remembers the size, modification time and content hash of
+        every notebook.  A notebook is only scanned again if its size or time
+        has changed and its hash is different, so after editing one chapter
+        :py:meth:`update` only reads that chapter.
+
+        Args:
+            path: The JSON file in which the registry is stored.  It is
+                created by :py:meth:`update` if it doesn't already exist.
+    '''
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.notebooks: Dict = {}
+        self.order: List = []
+        if os.path.exists(path):
+            with open(path, 'rt', encoding='utf-8') as input_file:
+                stored = json.load(input_file)
+            self.notebooks = stored['notebooks']
+            self.order = stored['order']
+
+    def update(self, notebooks: Iterable[str]) -> List[str]:
+        ''' Bring the registry up to date with the notebooks of the book.
+
+        Args:
+            notebooks: The paths of the notebooks in document order.  Any
+                notebook previously registered but not in this list is
+                dropped.
+
+        Returns:
+            The paths of the notebooks which were scanned.
+        '''
+        self.order = list(notebooks)
+        scanned = []
+        for notebook in self.order:
+            stat = os.stat(notebook)
+            record = self.notebooks.get(notebook)
+            if (record is not None and record['size'] == stat.st_size
+                    and record['mtime'] == stat.st_mtime):
+                continue
+            digest = _digest(notebook)
+            if record is None or record['digest'] != digest:
+                record = scan_notebook(notebook)
+                record['digest'] = digest
+                scanned.append(notebook)
+            record['size'] = stat.st_size
+            record['mtime'] = stat.st_mtime
+            self.notebooks[notebook] = record
+        for notebook in set(self.notebooks) - set(self.order):
+            del self.notebooks[notebook]
+        self.save()
+        return scanned
+
+    def save(self) -> None:
+        ''' Write the registry to its JSON file '''
+        temporary_path = self.path + '.tmp'
+        with open(temporary_path, 'wt', encoding='utf-8') as output_file:
+            json.dump({'notebooks': self.notebooks, 'order': self.order},
+                      output_file)
+        os.replace(temporary_path, self.path)
+
+    def reference_type(self, variable: str) -> str:
+        ''' The container class used for a variable anywhere in the book.
+
+        Falls back on the methods called on it if no notebook constructs it.
+        '''
+        return container_type((self.notebooks[notebook] for notebook in self.order),
+                              variable)
+
+    def usage(self, variable: str) -> Dict:
+        ''' The book wide numbering of a container variable.
+
+        Args:
+            variable: The name of the variable holding the container in
+                the notebooks, e.g. :code:`'citations'`
+
+        Returns:
+            A usage log which can be passed to :code:`load_usage` on a
+            :py:class:`jocument.Footnotes`, :py:class:`jocument.Citations`
+            or :py:class:`jocument.Labels`.  It has no entries, since the
+            notebooks aren't run, so each chapter has to define the names
+            it outputs.
+        '''
+        numbering_methods = _NUMBERING_METHODS[self.reference_type(variable)]
+        names: List = []
+        seen = set()
+        for notebook in self.order:
+            for method, name in self.notebooks[notebook]['calls'].get(variable, []):
+                if method in numbering_methods and name not in seen:
+                    seen.add(name)
+                    names.append(name)
+        return {'names': names, 'entries': {}}
+
+    def numbering(self, variable: str) -> Dict[str, int]:
+        ''' The book wide number of each name used with a container variable '''
+        return {name: index + 1
+                for index, name in enumerate(self.usage(variable)['names'])}
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Completion documentation
+
+IPython tab completion of reference names.  Pressing tab after::
+
+    citations.cite('kah
+
+completes the names stored with :code:`citations.reference` which start
+with "kah".  The same works for :code:`footnotes.ref`, :code:`footnotes.num`,
+:code:`figures.ref` and the :code:`ref` of a
+:py:class:`jocument.LabelRegistry`.  The completer is registered when
+jocument is imported in IPython.
+"""
+import re
+from typing import List
+
+import IPython
+
+from jocument.references import LabelRegistry, _References
+
+# An unfinished call such as citations.cite('kah at the end of the line
+_CALL_RE = re.compile(r'''\b(?P<variable>[A-Za-z_]\w*)\.(?P<method>ref|num|cite)\(\s*'''
+                      r'''(?P<quote>['"])(?P<prefix>[^'"]*)$''')
+
+# The most completions offered
+MAX_COMPLETIONS = 1000
+
+
+def complete_reference(namespace: dict, line: str, text: str) -> List[str]:
+    ''' The completions of a reference name being typed.
+
+    Args:
+        namespace: The user's namespace, holding the containers
+        line: The line up to the cursor
+        text: The part of the line that IPython is completing, which may be
+            just the end of the name if the name has punctuation in it
+
+    Returns:
+        The completions of text, empty if the cursor isn't in a reference name
+    '''
+    match = _CALL_RE.search(line)
+    if match is None:
+        return []
+    container = namespace.get(match.group('variable'))
+    if not isinstance(container, (_References, LabelRegistry)):
+        return []
+    prefix = match.group('prefix')
+    if not prefix.endswith(text):
+        return []
+    return [text + name[len(prefix):]
+            for name in container.complete(prefix, MAX_COMPLETIONS)]
+
+
+def _reference_matcher(text: str) -> List[str]:
+    ''' The IPython custom matcher '''
+    ipython = IPython.core.getipython.get_ipython()
+    if ipython is None:
+        return []
+    return complete_reference(ipython.user_ns, ipython.Completer.text_until_cursor, text)
+
+
+def register(ipython) -> None:
+    ''' Add the reference name completer to an IPython shell, once '''
+    matchers = ipython.Completer.custom_matchers
+    if not any(getattr(matcher, '__name__', None) == '_reference_matcher'
+               for matcher in matchers):
+        matchers.append(_reference_matcher)
+
+
+# Register our completer
+_IPYTHON = IPython.core.getipython.get_ipython()
+if _IPYTHON is not None:
+    register(_IPYTHON)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Daemon documentation
+
+A long running stripper which keeps nbconvert, nbformat, Beautiful Soup and
+the compiled HTML template loaded, so each conversion doesn't pay several
+seconds of start up.  Jobs are sent as JSON, one per line, either on stdin
+or over a Unix socket, and each gets one line of JSON back.
+
+Start it with::
+
+    python -m jocument.daemon --socket /tmp/jocument.sock
+
+and send jobs like::
+
+    {"id": 1, "path": "notebook.ipynb", "compact": true}
+    {"id": 2, "notebook": {... the notebook JSON ...}}
+    {"id": 3, "html": "... HTML already exported from Jupyter ..."}
+
+The reply is :code:`{"id": 1, "html": "..."}` or
+:code:`{"id": 1, "error": "..."}`.  :code:`{"command": "shutdown"}` stops
+a socket daemon.  :py:func:`convert_with_daemon` is a small client.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+from typing import Dict, IO
+
+import nbformat
+
+from jocument.instrumentation import StageMetrics
+from jocument.stripper import convert_notebook, notebook_to_html, strip_html
+
+logger = logging.getLogger(__name__)
+# The stage metrics of each job are emitted here, at INFO, with --metrics
+metrics_logger = logging.getLogger(__name__ + '.metrics')
+
+
+def handle_request(request: Dict) -> Dict:
+    ''' Carry out one job and return the reply.
+
+        The time of each stage of the job is logged as JSON to
+        :code:`metrics_logger` if it is enabled for INFO.
+    '''
+    reply = {'id': request.get('id')}
+    compact = bool(request.get('compact', False))
+    metrics = StageMetrics(metrics_logger)
+    try:
+        if 'path' in request:
+            reply['html'] = convert_notebook(request['path'], metrics, compact)
+        elif 'notebook' in request:
+            notebook = nbformat.from_dict(request['notebook'])
+            reply['html'] = strip_html(notebook_to_html(notebook, metrics), metrics, compact)
+        elif 'html' in request:
+            reply['html'] = strip_html(request['html'], metrics, compact)
+        else:
+            reply['error'] = 'Expected one of "path", "notebook" or "html"'
+    except Exception as error: #pylint: disable=broad-except
+        logger.exception('Job %s failed', reply['id'])
+        reply['error'] = repr(error)
+    if metrics.enabled and metrics.stages:
+        metrics_logger.info('%s', json.dumps({'id': reply['id'], **metrics.as_dict()}))
+    return reply
+
+
+def _handle_line(line: str) -> Dict:
+    try:
+        request = json.loads(line)
+    except ValueError as error:
+        return {'id': None, 'error': f'Invalid JSON: {error}'}
+    if not isinstance(request, dict):
+        return {'id': None, 'error': 'Expected a JSON object'}
+    return handle_request(request)
+
+
+def warm_up() -> None:
+    ''' Convert a small notebook so the template is compiled and the markdown
+        and syntax highlighting modules are loaded before the first job
+    '''
+    notebook = nbformat.v4.new_notebook()
+    notebook.cells.append(nbformat.v4.new_markdown_cell('# Title\n\nSome *text*'))
+    code_cell = nbformat.v4.new_code_cell('print(1)')
+    code_cell.outputs.append(nbformat.v4.new_output('stream', text='1\n'))
+    notebook.cells.append(code_cell)
+    strip_html(notebook_to_html(notebook))
+
+
+def serve_stdio(input_stream: IO = None, output_stream: IO = None) -> None:
+    ''' Answer jobs read from input_stream (stdin) until it is closed '''
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+    for line in input_stream:
+        if not line.strip():
+            continue
+        output_stream.write(json.dumps(_handle_line(line)) + '\n')
+        output_stream.flush()
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    ''' Answer the jobs sent on one connection '''
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            request = None
+            try:
+                request = json.loads(line)
+            except ValueError:
+                pass
+            if isinstance(request, dict) and request.get('command') == 'shutdown':
+                self.wfile.write(b'{"id": null, "shutdown": true}\n')
+                # shutdown() waits for serve_forever() so can't be called from it
+                threading.Thread(target=self.server.shutdown).start()
+                return
+            reply = _handle_line(line.decode('utf-8'))
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+def serve_unix(socket_path: str) -> None:
+    ''' Answer jobs sent to a Unix socket until asked to shut down.
+
+        Connections are handled one at a time, which keeps the conversions
+        on a single warm exporter.  Since a job can ask for any file to be
+        read, only the user running the daemon can connect to the socket.
+    '''
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    # Create the socket without group or other permissions so there is no
+    # moment when others could connect, and make sure of it afterwards
+    old_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, _JobHandler)
+    finally:
+        os.umask(old_umask)
+    with server:
+        os.chmod(socket_path, 0o600)
+        logger.info('Listening on %s', socket_path)
+        try:
+            server.serve_forever(poll_interval=0.1)
+        finally:
+            os.unlink(socket_path)
+
+
+def convert_with_daemon(socket_path: str, request: Dict) -> Dict:
+    ''' Send one job to a daemon listening on socket_path and return the reply '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile('rb') as replies:
+            return json.loads(replies.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep the stripper warm and convert jobs')
+    parser.add_argument('--socket', help='listen on this Unix socket instead of stdin')
+    parser.add_argument('--metrics', action='store_true',
+                        help='log the time of each stage of each job as JSON')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s',
+                        stream=sys.stderr)
+    if not args.metrics:
+        metrics_logger.setLevel(logging.WARNING)
+    warm_up()
+    if args.socket:
+        serve_unix(args.socket)
+    else:
+        serve_stdio()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""Indexes documentation
+
+Indexes over the names registered with :py:class:`jocument.Footnotes`,
+:py:class:`jocument.Citations` and :py:class:`jocument.Labels`.
+"""
+import bisect
+import collections
+import heapq
+import itertools
+from typing import Any, Dict, FrozenSet, Hashable, List, Set, Tuple
+
+import IPython
+
+
+def _trigrams(name: str) -> FrozenSet[str]:
+    ''' The trigrams of a name, padded so that short names have some '''
+    padded = f'  {name.casefold()} '
+    return frozenset(padded[index:index + 3] for index in range(len(padded) - 2))
+
+
+class TrigramIndex():
+    ''' An index from trigrams to names used to suggest the nearest names
+        to one that isn't found.
+
+        A query counts how many of its rarest trigrams each name shares and
+        then only works out the similarity of the names with the highest
+        counts, so the time taken doesn't grow with the number of names.
+        At least the four rarest trigrams are counted, since a one character
+        typo changes at most three, and then more until :code:`max_postings`
+        names have been counted.
+
+        A trigram shared by more than :code:`max_postings` names, such as
+        "smi" when there are thousands of "smith" names, is never counted
+        in full.  It only adds to the count of the names already found, or
+        if there are none, a sample of :code:`max_postings` of its names is
+        counted.
+
+        Args:
+            max_postings: The number of postings after which no more
+                trigrams are counted, and the most names counted for one
+                trigram
+    '''
+
+    def __init__(self, max_postings: int = 300):
+        self.max_postings: int = max_postings
+        self.postings: Dict[str, Set[str]] = {}
+        self.grams: Dict[str, FrozenSet[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.grams)
+
+    def add(self, name: str) -> None:
+        ''' Add a name.  Adding it again does nothing '''
+        if name in self.grams:
+            return
+        grams = _trigrams(name)
+        self.grams[name] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(name)
+
+    def nearest(self, name: str, limit: int = 3, threshold: float = 0.3) -> List[str]:
+        ''' The names most similar to name.
+
+        Args:
+            name: The name which wasn't found
+            limit: The most names to return
+            threshold: The least Jaccard similarity of the trigrams
+                for a name to be returned
+
+        Returns:
+            Up to limit names, most similar first
+        '''
+        query = _trigrams(name)
+        postings = sorted((self.postings[gram] for gram in query if gram in self.postings),
+                          key=len)
+        counts: collections.Counter = collections.Counter()
+        counted = 0
+        for index, posting in enumerate(postings):
+            if index >= 4 and counted >= self.max_postings:
+                break
+            if len(posting) <= self.max_postings:
+                counts.update(posting)
+                counted += len(posting)
+            elif counts:
+                for candidate in counts:
+                    if candidate in posting:
+                        counts[candidate] += 1
+            else:
+                counts.update(itertools.islice(posting, self.max_postings))
+                counted += self.max_postings
+        scored = []
+        for candidate, _ in counts.most_common(limit * 5):
+            grams = self.grams[candidate]
+            common = len(query & grams)
+            score = common / (len(query) + len(grams) - common)
+            if score >= threshold:
+                scored.append((score, candidate))
+        return [candidate for _, candidate in heapq.nlargest(limit, scored)]
+
+
+class PrefixIndex():
+    ''' A sorted list of names for completing a prefix.
+
+        Completing a prefix is two binary searches, so it takes O(log n)
+        plus the number of names returned.  Adding a name is a binary search
+        and a list insert.
+    '''
+
+    def __init__(self):
+        self.names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str) -> None:
+        ''' Add a name.  Adding it again does nothing '''
+        index = bisect.bisect_left(self.names, name)
+        if index == len(self.names) or self.names[index] != name:
+            self.names.insert(index, name)
+
+    def complete(self, prefix: str, limit: int = None) -> List[str]:
+        ''' The names starting with prefix, in sorted order
+
+        Args:
+            prefix: The start of the name
+            limit: The most names to return, or all of them if None
+        '''
+        start = bisect.bisect_left(self.names, prefix)
+        end = bisect.bisect_left(self.names, prefix + '\U0010ffff', start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.names[start:end]
+
+
+def current_cell() -> Hashable:
+    ''' An id for the cell being run.
+
+    This is the cell id which JupyterLab and Notebook 7 send with each
+    request, which stays the same when the cell is re-run or moved.  Failing
+    that it is the execution count, and outside IPython it is None.
+    '''
+    shell = IPython.core.getipython.get_ipython()
+    if shell is None:
+        return None
+    get_parent = getattr(shell, 'get_parent', None)
+    parent = get_parent() if get_parent is not None else getattr(shell, 'parent_header', None)
+    if isinstance(parent, dict):
+        cell_id = (parent.get('metadata') or {}).get('cellId')
+        if cell_id is not None:
+            return cell_id
+    return shell.execution_count
+
+
+def current_run() -> Hashable:
+    ''' An id for the current run of a cell: the execution count, which goes
+        up each time a cell is run, or None outside IPython
+    '''
+    shell = IPython.core.getipython.get_ipython()
+    return shell.execution_count if shell is not None else None
+
+
+class UsageIndex():
+    ''' Where each name is used: the (cell id, position) of every reference.
+
+        The uses of each name are kept in a dictionary used as an ordered
+        set, so looking up a name is O(1) and re-running a cell doesn't
+        record its uses twice.
+
+        A use recorded without a position is given the number of earlier
+        uses of the same name in the same run of the cell, so that using a
+        name twice in one cell records two uses, (cell, 0) and (cell, 1),
+        while running the cell again records the same ones.
+
+        Args:
+            cell: Called with no arguments to get the id of the cell being
+                run.  Defaults to :py:func:`current_cell`.
+            run: Called with no arguments to get an id of the current run of
+                the cell, which restarts the counts of uses without a
+                position.  Defaults to :py:func:`current_run`.
+    '''
+
+    def __init__(self, cell=current_cell, run=current_run):
+        self.cell = cell
+        self.run = run
+        self.uses: Dict[str, Dict[Tuple[Hashable, Any], None]] = {}
+        # The (cell id, run) being counted and the uses of each name in it
+        self._run: Tuple[Hashable, Any] = None
+        self._counts: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.uses)
+
+    def record(self, name: str, position: Any = None) -> None:
+        ''' Note a use of name at position in the current cell, or the next
+            use of name in the cell if position is None
+        '''
+        cell = self.cell()
+        if position is None:
+            run = (cell, self.run())
+            if run != self._run:
+                self._run = run
+                self._counts = {}
+            position = self._counts.get(name, 0)
+            self._counts[name] = position + 1
+        self.uses.setdefault(name, {})[(cell, position)] = None
+
+    def where_used(self, name: str) -> List[Tuple[Hashable, Any]]:
+        ''' The (cell id, position) of each use of name, in the order first used '''
+        return list(self.uses.get(name, ()))
+
+    def clear(self) -> None:
+        ''' Forget all the uses '''
+        self.uses = {}
+        self._run = None
+        self._counts = {}
+
+    def export(self) -> Dict[str, List[List]]:
+        ''' The uses of every name as lists, so they can be written out with
+            :code:`json.dump`
+        '''
+        return {name: [list(use) for use in uses] for name, uses in self.uses.items()}
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Instrumentation documentation
+
+Counters and timers used to see what the jocument helpers cost a notebook.
+They are all opt-in and nothing is recorded unless they are switched on.
+"""
+import contextlib
+import json
+import logging
+import time
+import tracemalloc
+from typing import Dict, Iterator, List
+
+
+class ReferenceStats():
+    ''' The counters kept by a :py:class:`jocument.Footnotes`,
+        :py:class:`jocument.Citations` or :py:class:`jocument.Labels`
+        once :code:`enable_stats()` has been called on it.
+
+        Attributes:
+            calls: The number of calls of each method, e.g. :code:`'cite'`
+            misses: The number of calls of each method for a name which
+                wasn't found
+            styler_calls: The number of calls of each
+                :py:class:`jocument.JocumentStyle` method
+            styler_seconds: The cumulative time spent in each
+                :py:class:`jocument.JocumentStyle` method
+            outputs: The number of calls of :code:`output()`
+            output_bytes: The cumulative length of the HTML returned by
+                :code:`output()`
+            last_output_bytes: The length of the HTML returned by the
+                last :code:`output()`
+    '''
+
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.styler_calls: Dict[str, int] = {}
+        self.styler_seconds: Dict[str, float] = {}
+        self.outputs: int = 0
+        self.output_bytes: int = 0
+        self.last_output_bytes: int = 0
+
+    def call(self, method: str) -> None:
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+    def miss(self, method: str) -> None:
+        self.misses[method] = self.misses.get(method, 0) + 1
+
+    def output(self, html: str) -> None:
+        self.outputs += 1
+        self.last_output_bytes = len(html.encode('utf-8'))
+        self.output_bytes += self.last_output_bytes
+
+    def styled(self, method: str, seconds: float) -> None:
+        self.styler_calls[method] = self.styler_calls.get(method, 0) + 1
+        self.styler_seconds[method] = self.styler_seconds.get(method, 0.0) + seconds
+
+    def as_dict(self) -> Dict:
+        ''' All the counters as a dictionary which can be dumped as JSON '''
+        return {'calls': dict(self.calls),
+                'misses': dict(self.misses),
+                'styler_calls': dict(self.styler_calls),
+                'styler_seconds': dict(self.styler_seconds),
+                'styler_total_seconds': sum(self.styler_seconds.values()),
+                'outputs': self.outputs,
+                'output_bytes': self.output_bytes,
+                'last_output_bytes': self.last_output_bytes}
+
+
+class TimedStyler():
+    ''' Wraps a :py:class:`jocument.JocumentStyle` so that the time spent in
+        each of its methods is added to a :py:class:`ReferenceStats`.
+
+        Only used while stats are enabled so an ordinary styler pays
+        nothing for it.
+    '''
+
+    def __init__(self, styler, stats: ReferenceStats):
+        self.styler = styler
+        self.stats = stats
+
+    def __getattr__(self, attribute: str):
+        value = getattr(self.styler, attribute)
+        if not callable(value):
+            return value
+        stats = self.stats
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return value(*args, **kwargs)
+            finally:
+                stats.styled(attribute, time.perf_counter() - start)
+        return timed
+
+
+class StageMetrics():
+    ''' Wall time and peak memory for each stage of a pipeline such as the
+        stripper's read, nbconvert export, parse, extract, serialize and write.
+
+        Usage is as follows::
+
+            metrics = StageMetrics(logger)
+            with metrics.stage('parse'):
+                soup = BeautifulSoup(html, 'html.parser')
+            ...
+            metrics.emit()
+
+        The wall time is always recorded and :py:meth:`emit` logs it if the
+        logger is enabled for INFO.  Peak memory is only traced with
+        :code:`tracemalloc`, which makes a conversion several times slower,
+        if asked for or if the logger is enabled for DEBUG.
+
+        Args:
+            logger: The logger the metrics are emitted to as JSON at INFO
+            trace_memory: Whether to record the peak memory of each stage.
+                Defaults to whether the logger is enabled for DEBUG.
+    '''
+
+    def __init__(self, logger: logging.Logger, trace_memory: bool = None):
+        self.logger: logging.Logger = logger
+        self.enabled: bool = logger.isEnabledFor(logging.INFO)
+        if trace_memory is None:
+            trace_memory = logger.isEnabledFor(logging.DEBUG)
+        self.trace_memory: bool = trace_memory
+        self.stages: List[Dict] = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        ''' Time the body of the with statement as the stage called name '''
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {'stage': name, 'seconds': time.perf_counter() - start}
+            if self.trace_memory:
+                record['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            self.stages.append(record)
+
+    def as_dict(self) -> Dict:
+        ''' The stages, in the order they were run, and the total time '''
+        return {'stages': list(self.stages),
+                'total_seconds': sum(stage['seconds'] for stage in self.stages)}
+
+    def emit(self) -> None:
+        ''' Log the metrics as a single line of JSON at INFO '''
+        if self.enabled:
+            self.logger.info('%s', json.dumps(self.as_dict()))
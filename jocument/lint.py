@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""Lint documentation
+
+Check a directory of notebooks for reference mistakes without running them.
+For each notebook it reports:
+
+* names which are referenced, e.g. with :code:`{{footnotes.ref('a_note')}}`,
+  but never defined with :code:`add` or :code:`reference`
+* footnotes and citations which are defined but never referenced
+* links in the saved outputs, such as :code:`href=#fn_3`, whose target
+  anchor isn't there, e.g. because the footnotes weren't output again
+  after a new footnote was added
+
+Like :py:class:`jocument.BookRegistry` only calls with a literal name are
+seen.  The notebooks are scanned in a process pool.  Run with::
+
+    python -m jocument.lint notebooks --jobs 4
+
+With :code:`--scope book` the definitions and references of all the
+notebooks are pooled, for books whose chapters share their containers.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import re
+import sys
+from typing import Dict, Iterable, List, NamedTuple
+
+from jocument.book import _scan_sources, container_type
+
+# The methods which define a name and those which refer to it
+_DEFINING_METHODS = ('add', 'reference')
+_REFERRING_METHODS = ('ref', 'num', 'cite')
+
+# The ids and links of footnotes and citations in rendered HTML
+_ANCHOR_RE = re.compile(r'''\b(id|href)\s*=\s*["']?(#?)((?:fn|fnret|cite|citeret)_\d+)\b''')
+
+# The output types which may hold rendered references
+_HTML_TYPES = ('text/html', 'text/markdown')
+
+
+class LintIssue(NamedTuple):
+    ''' One problem found in a notebook '''
+    notebook: str
+    kind: str
+    message: str
+
+    def __str__(self):
+        return f'{self.notebook}: {self.kind}: {self.message}'
+
+
+def _join(text) -> str:
+    return ''.join(text) if isinstance(text, list) else text
+
+
+def _rendered_html(notebook: Dict) -> Iterable[str]:
+    ''' The HTML saved in a notebook: the outputs of code cells and the
+        values Python Markdown stored for the {{ }} expressions in markdown
+    '''
+    for cell in notebook.get('cells', []):
+        variables = cell.get('metadata', {}).get('variables')
+        if isinstance(variables, dict):
+            for value in variables.values():
+                if isinstance(value, str):
+                    yield value
+        for output in cell.get('outputs', []):
+            data = output.get('data', {})
+            for mime_type in _HTML_TYPES:
+                if mime_type in data:
+                    yield _join(data[mime_type])
+
+
+def _broken_anchors(notebook: Dict) -> List[str]:
+    ''' The footnote and citation links whose target id isn't in the outputs '''
+    ids = set()
+    links = {}
+    for html in _rendered_html(notebook):
+        if 'fn' not in html and 'cite' not in html:
+            continue
+        for match in _ANCHOR_RE.finditer(html):
+            attribute, hash_sign, anchor = match.groups()
+            if attribute == 'id':
+                ids.add(anchor)
+            elif hash_sign:
+                links.setdefault(anchor, None)
+    return [anchor for anchor in links if anchor not in ids]
+
+
+def scan_for_lint(path: str) -> Dict:
+    ''' Read a notebook once and collect what the lint checks need.
+
+    This runs in the worker processes, so only returns plain data.
+
+    Args:
+        path: The path to the .ipynb file
+
+    Returns:
+        The dictionary of :py:func:`jocument.book.scan_notebook` with
+        :code:`broken_anchors` added, or with just :code:`error` if the
+        notebook can't be read.
+    '''
+    try:
+        with open(path, 'rt', encoding='utf-8') as input_file:
+            notebook = json.load(input_file)
+        record = _scan_sources(notebook)
+        record['broken_anchors'] = _broken_anchors(notebook)
+    except (OSError, ValueError) as error:
+        return {'error': repr(error)}
+    return record
+
+
+def _names(record: Dict, variable: str, methods: Iterable[str]) -> Dict[str, None]:
+    return {name: None for method, name in record['calls'].get(variable, [])
+            if method in methods}
+
+
+def lint_records(records: Dict[str, Dict], scope: str = 'notebook') -> List[LintIssue]:
+    ''' Check scanned notebooks.
+
+    Args:
+        records: The result of :py:func:`scan_for_lint` for each notebook path,
+            in document order
+        scope: 'notebook' checks each notebook on its own.  'book' pools the
+            definitions and references of all the notebooks, so a name only
+            needs to be defined in one of them.
+
+    Returns:
+        The issues, in the order of the notebooks
+    '''
+    if scope not in ('notebook', 'book'):
+        raise ValueError('scope must be "notebook" or "book"')
+    issues = []
+    readable = {path: record for path, record in records.items() if 'error' not in record}
+    for path, record in records.items():
+        if 'error' in record:
+            issues.append(LintIssue(path, 'unreadable', record['error']))
+    pooled_defined: Dict = {}
+    pooled_referred: Dict = {}
+    pooled_kinds: Dict = {}
+    if scope == 'book':
+        for record in readable.values():
+            for variable in record['calls']:
+                if variable not in pooled_kinds:
+                    pooled_kinds[variable] = container_type(readable.values(), variable)
+                pooled_defined.setdefault(variable, {}).update(
+                    _names(record, variable, _DEFINING_METHODS))
+                pooled_referred.setdefault(variable, {}).update(
+                    _names(record, variable, _REFERRING_METHODS))
+    for path, record in readable.items():
+        for variable in record['calls']:
+            if scope == 'book':
+                kind = pooled_kinds[variable]
+                defined = pooled_defined[variable]
+                referred = pooled_referred[variable]
+            else:
+                kind = container_type([record], variable)
+                defined = _names(record, variable, _DEFINING_METHODS)
+                referred = _names(record, variable, _REFERRING_METHODS)
+            for name in _names(record, variable, _REFERRING_METHODS):
+                if name not in defined:
+                    issues.append(LintIssue(path, 'undefined',
+                                            f'{variable} "{name}" is referenced '
+                                            'but never defined'))
+            if kind == 'Labels':
+                # Adding a label numbers it, so an unreferenced label is fine
+                continue
+            for name in _names(record, variable, _DEFINING_METHODS):
+                if name not in referred:
+                    issues.append(LintIssue(path, 'unused',
+                                            f'{variable} "{name}" is defined '
+                                            'but never referenced'))
+        for anchor in record['broken_anchors']:
+            issues.append(LintIssue(path, 'broken anchor',
+                                    f'a link to #{anchor} has no id={anchor}'))
+    return issues
+
+
+def find_notebooks(directory: str) -> List[str]:
+    ''' The .ipynb files under directory in sorted order, skipping checkpoints '''
+    notebooks = []
+    for root, directories, files in os.walk(directory):
+        directories[:] = sorted(name for name in directories
+                                if name != '.ipynb_checkpoints')
+        notebooks.extend(os.path.join(root, name) for name in sorted(files)
+                         if name.endswith('.ipynb'))
+    return notebooks
+
+
+def lint_notebooks(notebooks: Iterable[str], jobs: int = None,
+                   scope: str = 'notebook') -> List[LintIssue]:
+    ''' Scan notebooks in a process pool and check them.
+
+    Args:
+        notebooks: The paths of the notebooks, in document order
+        jobs: The number of worker processes.  Defaults to the number of
+            CPUs.  With 1 the notebooks are scanned in this process.
+        scope: See :py:func:`lint_records`
+    '''
+    notebooks = list(notebooks)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(notebooks) < 2:
+        scanned = map(scan_for_lint, notebooks)
+        return lint_records(dict(zip(notebooks, scanned)), scope)
+    # Large chunks keep the pickling overhead small next to json.load
+    chunksize = max(1, len(notebooks) // (jobs * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        scanned = executor.map(scan_for_lint, notebooks, chunksize=chunksize)
+        return lint_records(dict(zip(notebooks, scanned)), scope)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Check the references in notebooks')
+    parser.add_argument('paths', nargs='+', help='notebooks or directories of notebooks')
+    parser.add_argument('--jobs', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--scope', choices=['notebook', 'book'], default='notebook')
+    parser.add_argument('--json', action='store_true', help='print the issues as JSON')
+    args = parser.parse_args(argv)
+    notebooks = []
+    for path in args.paths:
+        notebooks.extend(find_notebooks(path) if os.path.isdir(path) else [path])
+    issues = lint_notebooks(notebooks, args.jobs, args.scope)
+    if args.json:
+        json.dump([issue._asdict() for issue in issues], sys.stdout, indent=1)
+        sys.stdout.write('\n')
+    else:
+        for issue in issues:
+            print(issue)
+    return 1 if issues else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Ordering documentation
+
+An order statistic tree used to number references by their position in the
+document rather than by the order in which they were first used.
+"""
+import random
+from typing import Any, Iterator, Optional
+
+
+class _Node():
+    ''' A node of the treap.  :code:`size` is the size of the subtree '''
+    __slots__ = ('key', 'priority', 'left', 'right', 'size')
+
+    def __init__(self, key: Any):
+        self.key = key
+        self.priority: float = random.random()
+        self.left: Optional['_Node'] = None
+        self.right: Optional['_Node'] = None
+        self.size: int = 1
+
+
+def _size(node: Optional[_Node]) -> int:
+    return node.size if node is not None else 0
+
+
+def _update(node: _Node) -> _Node:
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+
+def _split(node: Optional[_Node], key: Any):
+    ''' Split into the keys less than key and the keys greater or equal '''
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        return _update(node), right
+    left, node.left = _split(node.left, key)
+    return left, _update(node)
+
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    ''' Merge two treaps where every key in left is less than every key in right '''
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+class OrderStatisticTree():
+    ''' A sorted set of keys which can tell you the rank of any key.
+
+        Inserting, removing and finding the rank of a key all take
+        O(log n) expected time.  It is a treap where every node
+        also keeps the size of its subtree.
+    '''
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+
+    def __len__(self) -> int:
+        return _size(self._root)
+
+    def __contains__(self, key: Any) -> bool:
+        node = self._root
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            elif node.key < key:
+                node = node.right
+            else:
+                return True
+        return False
+
+    def __iter__(self) -> Iterator:
+        stack = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key
+            node = node.right
+
+    def insert(self, key: Any) -> None:
+        ''' Add a key.  Adding a key which is already present does nothing '''
+        if key in self:
+            return
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key: Any) -> None:
+        ''' Remove a key.  Removing a key which isn't present does nothing '''
+        left, right = _split(self._root, key)
+        _, right = _split_first(right, key)
+        self._root = _merge(left, right)
+
+    def rank(self, key: Any) -> int:
+        ''' The number of keys less than key '''
+        rank = 0
+        node = self._root
+        while node is not None:
+            if node.key < key:
+                rank += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+
+def _split_first(node: Optional[_Node], key: Any):
+    ''' Split off the smallest node if its key is key '''
+    if node is None:
+        return None, None
+    if node.left is None:
+        if node.key == key:
+            return node, node.right
+        return None, node
+    first, node.left = _split_first(node.left, key)
+    return first, _update(node)
@@ -2,15 +2,69 @@
 """References documentation
 
 """
-from typing import Tuple, List, Dict
+import bisect
+import logging
+import operator
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Tuple, List, Dict, Iterable, Union
+
+from jocument.indexes import PrefixIndex, TrigramIndex, UsageIndex
+from jocument.instrumentation import ReferenceStats, TimedStyler
+from jocument.ordering import OrderStatisticTree
+from jocument.sections import SectionCounters, Sections
+
+logger = logging.getLogger(__name__)
+
+# The values of on_missing for the reference containers
+ON_MISSING = ('render', 'log', 'raise')
+
+# The replacements made by JocumentStyle.escape_text.  & must be first.
+_HTML_ESCAPES: Tuple = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'),
+                        ('"', '&quot;'), ("'", '&#x27;'))
 
 
 class JocumentStyle():
     ''' A class designed to be used only as a singleton which defines the
         formatting and CSS to be used with the Jocument helper classes and
         functions
+
+        Args:
+            escape: Defaults to False.  If True then footnote text, citation
+                authors, titles and sources and label titles are HTML escaped
+                when they are first rendered, so that the text can contain
+                characters such as :code:`<` and :code:`&`.
     '''
 
+    escape: bool = False
+
+    def __init__(self, escape: bool = False):
+        self.escape = escape
+
+    def escape_text(self, text: str) -> str:
+        ''' Escape text for HTML if :code:`escape` is set.
+
+        :py:class:`Footnotes`, :py:class:`Citations` and :py:class:`Labels`
+        store the raw text and call this the first time an entry is
+        rendered by each styler, not each time it is rendered.
+
+        Args:
+            text: The raw text.  Anything else but None, such as a number,
+                is converted to a string first.
+
+        Returns:
+            The text with &, <, >, " and ' replaced by character references
+            if :code:`escape` is set, otherwise the text unchanged.
+        '''
+        if not self.escape or text is None:
+            return text
+        text = str(text)
+        for character, replacement in _HTML_ESCAPES:
+            if character in text:
+                text = text.replace(character, replacement)
+        return text
+
     def footnote_reference(self, number: int, name: str, text: str) -> str: #pylint: disable=unused-argument
         '''Formats the footnote reference in the text
 
@@ -76,12 +130,15 @@ class JocumentStyle():
 
         The default implementation returns::
 
-            f'<li id=fn_{number}>{text}<a href=#fnret_{number}>&#8629;</a></li>' # noqa 501
+            f'<li value={number} id=fn_{number}>{text}<a href=#fnret_{number}>&#8629;</a></li>' # noqa 501
 
         This is a superscript number which is hyperlinked to a location
-        with id fn_<the number>
+        with id fn_<the number>.  The value keeps the number of the list
+        item right when the footnotes of one chapter of a book don't start
+        at 1.
         '''
-        return f'<li id=fn_{number}>{text}<a href=#fnret_{number}>&#8629;</a></li>' # noqa 501
+        return (f'<li value={number} id=fn_{number}>{text}'
+                f'<a href=#fnret_{number}>&#8629;</a></li>')
 
     def footnotes_end(self):
         ''' Called at the end beginning of outputting footnotes
@@ -140,12 +197,15 @@ class JocumentStyle():
         string **Author**, *Title*, Source and returns a list item::
 
             ref_str = f'<strong>{ref[0]}</strong>, <em>{ref[1]}</em>, {ref[2]}' # noqa 501
-            f'<li id=cite_{number}>{ref_str}<a href=#citeret_{number}>&#8629;</a></li>' # noqa 501
+            f'<li value={number} id=cite_{number}>{ref_str}<a href=#citeret_{number}>&#8629;</a></li>' # noqa 501
 
+        The value keeps the number of the list item right when the
+        citations are output sorted rather than in the order they are
+        numbered.
         '''
         ref_str = '<strong>{0}</strong>, <em>{1}</em>, {2}'.format(*ref)
-        return (f'<li id=cite_{number}>{ref_str}<a href=#citeret_{number}>&#8629;'
-                f'</a></li>')
+        return (f'<li value={number} id=cite_{number}>{ref_str}'
+                f'<a href=#citeret_{number}>&#8629;</a></li>')
 
     def references_end(self):
         ''' Called at the end beginning of outputting footnotes
@@ -162,6 +222,10 @@ class JocumentStyle():
     def label(self, ref_type: str, number: int, name: str, title: str) -> str: #pylint: disable=unused-argument
         ''' The styler for a Label.
 
+            If the labels are numbered by section then number is a
+            :py:class:`jocument.sections.LabelNumber`, which formats as
+            e.g. "4.3".
+
             Typically these are charts, graphs or tables and so
             we want the type, the number and maybe the title.
 
@@ -209,7 +273,459 @@ class JocumentStyle():
         return f'<a href=#ref_{ref_type}{number}>{ref_type} {number}</a>'
 
 
-class Footnotes():
+def _missing(kind: str, on_missing: str, name: str, template: str,
+             suggestions: List[str]) -> str:
+    ''' Deal with a name which isn't found according to on_missing.
+
+    Args:
+        kind: What the name was looked up in, for the log message
+        on_missing: One of :py:data:`ON_MISSING`
+        name: The name
+        template: The text rendered in place of the reference, with
+            {name} and {hint} fields.  The hint suggests the nearest names.
+        suggestions: The nearest names
+    '''
+    hint = ''
+    if suggestions:
+        hint = ', did you mean {}?'.format(' or '.join(f'"{suggestion}"'
+                                                      for suggestion in suggestions))
+    text = template.format(name=name, hint=hint)
+    if on_missing == 'raise':
+        raise KeyError(f'"{name}" not found{hint}')
+    if on_missing == 'log':
+        logger.warning('%s "%s" not found%s', kind, name, hint)
+    return text
+
+
+def _is_lazy(value: Any) -> bool:
+    ''' Whether value is a footnote text or citation still to be evaluated '''
+    if isinstance(value, tuple):
+        return any(callable(field) for field in value)
+    return callable(value)
+
+
+def _call(value: Any) -> Any:
+    ''' Evaluate value if it is callable '''
+    return value() if callable(value) else value
+
+
+class _References():
+    ''' The first-use numbering shared by :py:class:`Footnotes`,
+        :py:class:`Citations` and :py:class:`Labels`.
+
+        Names are numbered in the order in which they are first used and
+        the number is kept in a dictionary so that later lookups don't have
+        to scan :code:`names`.
+
+        If :code:`threadsafe` is set then the check-then-append of a new name
+        is done under a lock so that many threads sharing one container can't
+        hand out duplicate or skipped numbers.  Names which already have a
+        number are looked up without taking the lock so there is no
+        contention once a name has been used.
+
+        If :code:`ordered` is set then names are instead numbered by their
+        position in the document, for example :code:`(cell index, offset)`,
+        which has to be passed with every call that numbers a name.  The
+        earliest position of each name is kept in an
+        :py:class:`jocument.ordering.OrderStatisticTree` so the number of a
+        name is its rank, and adding or removing a reference renumbers the
+        rest in O(log n) without re-running the notebook.
+
+        Calling :py:meth:`enable_stats` starts counting calls, misses,
+        output sizes and the time spent in the styler.  Until then the only
+        cost is checking that :code:`stats` is None.
+
+        When a name isn't found the nearest defined names are suggested
+        using a :py:class:`jocument.indexes.TrigramIndex`.  It is built the
+        first time a name isn't found and kept up to date after that.
+        :code:`on_missing` says whether the miss is just rendered in the
+        text ('render'), also logged as a warning ('log') or raises a
+        KeyError ('raise').
+
+        Names can be completed from a prefix with :py:meth:`complete`,
+        which is what the IPython tab completion in
+        :py:mod:`jocument.completion` uses.  The
+        :py:class:`jocument.indexes.PrefixIndex` it needs is also only built
+        the first time it is used.
+
+        Calling :py:meth:`enable_usage_index` starts recording the cell and
+        position of every reference in a :py:class:`jocument.indexes.UsageIndex`
+        so :py:meth:`where_used` can say where a name is used.  A reference
+        made without a position is recorded at the count of earlier
+        references to the name in the same cell.
+    '''
+
+    def __init__(self, styler: JocumentStyle = None, threadsafe: bool = False,
+                 ordered: bool = False, on_missing: str = 'render'):
+        if on_missing not in ON_MISSING:
+            raise ValueError(f'on_missing must be one of {ON_MISSING}')
+        if styler is None:
+            self.styler: JocumentStyle = JocumentStyle()
+        else:
+            self.styler = styler
+        self.names: List = []
+        self._numbers: Dict = {}
+        self._lock = threading.RLock() if threadsafe else None
+        # For ordered numbering, the sorted positions of each name and a tree
+        # of (earliest position, name)
+        self._positions: Dict = {} if ordered else None
+        self._tree: OrderStatisticTree = OrderStatisticTree() if ordered else None
+        self.stats: ReferenceStats = None
+        self.on_missing: str = on_missing
+        self._trigrams: TrigramIndex = None
+        self._prefixes: PrefixIndex = None
+        self.usage: UsageIndex = None
+        # The text of each name escaped by each class of styler, see _escaped_text
+        self._escaped: Dict = {}
+
+    def _defined(self) -> Iterable[str]:
+        ''' The names which have been defined '''
+        raise NotImplementedError
+
+    def _register(self, name: str) -> None:
+        ''' Note a newly defined name in the name indexes which have been built '''
+        if self._trigrams is not None:
+            self._trigrams.add(name)
+        if self._prefixes is not None:
+            self._prefixes.add(name)
+
+    def complete(self, prefix: str, limit: int = None) -> List[str]:
+        ''' The defined names starting with prefix, in sorted order.
+
+        Args:
+            prefix: The start of the name
+            limit: The most names to return, or all of them if None
+        '''
+        if self._prefixes is None:
+            prefixes = PrefixIndex()
+            prefixes.names = sorted(set(self._defined()))
+            self._prefixes = prefixes
+        return self._prefixes.complete(prefix, limit)
+
+    def suggest(self, name: str, limit: int = 3) -> List[str]:
+        ''' The defined names nearest to name, e.g. to correct a typo.
+
+        Args:
+            name: The name which wasn't found
+            limit: The most names to suggest
+
+        Returns:
+            Up to limit names, nearest first
+        '''
+        if self._trigrams is None:
+            trigrams = TrigramIndex()
+            for defined in list(self._defined()):
+                trigrams.add(defined)
+            self._trigrams = trigrams
+        return self._trigrams.nearest(name, limit)
+
+    def _missing(self, name: str, template: str) -> str:
+        ''' Deal with a name which isn't found according to on_missing.
+
+        Args:
+            name: The name
+            template: The text rendered in place of the reference, with
+                {name} and {hint} fields.  The hint suggests the nearest names.
+        '''
+        return _missing(type(self).__name__, self.on_missing, name, template,
+                        self.suggest(name))
+
+    def enable_stats(self) -> ReferenceStats:
+        ''' Start counting calls, misses and output sizes and timing the styler.
+
+        Returns:
+            The :py:class:`jocument.instrumentation.ReferenceStats` which is
+            updated from now on.  It is also available as :code:`stats`.
+        '''
+        if self.stats is None:
+            self.stats = ReferenceStats()
+            self.styler = TimedStyler(self.styler, self.stats)
+        return self.stats
+
+    def disable_stats(self) -> None:
+        ''' Stop counting and restore the original styler '''
+        if self.stats is not None:
+            self.styler = self.styler.styler
+            self.stats = None
+
+    def stats_dict(self) -> Dict:
+        ''' The counters as a dictionary, empty if stats aren't enabled '''
+        return self.stats.as_dict() if self.stats is not None else {}
+
+    def enable_usage_index(self, cell: Callable[[], Any] = None) -> UsageIndex:
+        ''' Start recording where each name is referenced.
+
+        Args:
+            cell: Called to get the id of the cell being run.  Defaults to
+                :py:func:`jocument.indexes.current_cell`.
+
+        Returns:
+            The :py:class:`jocument.indexes.UsageIndex`, which is also
+            available as :code:`usage`.
+        '''
+        if self.usage is None:
+            self.usage = UsageIndex() if cell is None else UsageIndex(cell)
+        return self.usage
+
+    def where_used(self, name: str) -> List[Tuple]:
+        ''' The (cell id, position) of each reference to name, empty if the
+            usage index isn't enabled
+        '''
+        return self.usage.where_used(name) if self.usage is not None else []
+
+    def _number(self, name: str, position: Any = None) -> int:
+        ''' The number of name, giving it the next number if it is new '''
+        if self._tree is not None:
+            return self._place(name, position)
+        number = self._numbers.get(name)
+        if number is None:
+            if self._lock is None:
+                number = self._append(name)
+            else:
+                with self._lock:
+                    number = self._numbers.get(name)
+                    if number is None:
+                        number = self._append(name)
+        return number
+
+    def _append(self, name: str) -> int:
+        ''' Number a new name.  Only call via :py:meth:`_number` '''
+        self.names.append(name)
+        number = len(self.names)
+        self._numbers[name] = number
+        return number
+
+    def _resolve(self, mapping: Dict, name: str, convert: Callable) -> Any:
+        ''' The value of mapping[name], evaluating it first if it is lazy.
+
+        A lazy value is evaluated at most once with convert applied to the
+        result, which then replaces it in mapping.
+        '''
+        value = mapping[name]
+        if not _is_lazy(value):
+            return value
+        if self._lock is None:
+            value = mapping[name] = convert(value)
+            return value
+        with self._lock:
+            value = mapping[name]
+            if _is_lazy(value):
+                value = mapping[name] = convert(value)
+            return value
+
+    def _escaped_text(self, styler: JocumentStyle, name: str, text: Any) -> Any:
+        ''' The raw text of name, or a tuple of its fields, escaped by styler.
+
+        The result is kept for each class of styler and :code:`escape`
+        setting, so rendering an entry again, e.g. by calling
+        :code:`output()` after each new reference or
+        :code:`output_targets` with new stylers, doesn't escape it again,
+        and the kept text can't grow with the number of stylers made.
+        '''
+        unwrapped = styler.styler if isinstance(styler, TimedStyler) else styler
+        key = (type(unwrapped), unwrapped.escape)
+        escaped = self._escaped.get(key)
+        if escaped is None:
+            escaped = self._escaped.setdefault(key, {})
+        if name in escaped:
+            return escaped[name]
+        if isinstance(text, tuple):
+            value = tuple(styler.escape_text(field) for field in text)
+        else:
+            value = styler.escape_text(text)
+        escaped[name] = value
+        return value
+
+    def _forget_escaped(self, name: str) -> None:
+        ''' Forget the escaped text of a name which has been redefined '''
+        for escaped in list(self._escaped.values()):
+            escaped.pop(name, None)
+
+    def _output_targets(self, targets: Dict[str, JocumentStyle], render: Callable) -> Dict[str, str]:
+        ''' Render the output of several stylers with one pass over the entries '''
+        rendered = render(list(targets.values()))
+        return {target: ''.join(parts) for target, parts in zip(targets, rendered)}
+
+    def _output(self, html: List[str]) -> str:
+        ''' Join the html of output(), counting it if stats are enabled '''
+        html = ''.join(html)
+        if self.stats is not None:
+            self.stats.call('output')
+            self.stats.output(html)
+        return html
+
+    def _lookup(self, name: str) -> int:
+        ''' The number of name or None if it hasn't been numbered '''
+        if self._tree is None:
+            return self._numbers.get(name)
+        positions = self._positions.get(name)
+        if not positions:
+            return None
+        return self._tree.rank((positions[0], name)) + 1
+
+    def _ordered_names(self) -> List:
+        ''' The names in the order of their numbers '''
+        if self._tree is None:
+            return list(self.names)
+        return [name for _, name in self._tree]
+
+    def _place(self, name: str, position: Any) -> int:
+        ''' Record a reference to name at a position and return its number '''
+        if position is None:
+            raise ValueError(f'A position is needed to number "{name}" by '
+                             'document position')
+        if self._lock is None:
+            return self._insert_position(name, position)
+        with self._lock:
+            return self._insert_position(name, position)
+
+    def _insert_position(self, name: str, position: Any) -> int:
+        positions = self._positions.setdefault(name, [])
+        index = bisect.bisect_left(positions, position)
+        if index == len(positions) or positions[index] != position:
+            if index == 0 and positions:
+                self._tree.remove((positions[0], name))
+            positions.insert(index, position)
+            self._tree.insert((positions[0], name))
+        return self._tree.rank((positions[0], name)) + 1
+
+    def unref(self, name: str, position: Any) -> None:
+        ''' Forget the reference to name at a position.
+
+        Only used when numbering by document position, for example when the
+        paragraph containing a reference is deleted.  If it was the only
+        reference to name then name loses its number and every later name
+        moves up by one.
+
+        Args:
+            name: The friendly name
+            position: The position passed when it was referenced
+        '''
+        if self._tree is None:
+            raise ValueError('unref is only available when numbering by '
+                             'document position')
+        if self._lock is None:
+            self._remove_position(name, position)
+        else:
+            with self._lock:
+                self._remove_position(name, position)
+
+    def _remove_position(self, name: str, position: Any) -> None:
+        positions = self._positions.get(name, [])
+        index = bisect.bisect_left(positions, position)
+        if index == len(positions) or positions[index] != position:
+            return
+        if index == 0:
+            self._tree.remove((positions[0], name))
+        del positions[index]
+        if not positions:
+            del self._positions[name]
+        elif index == 0:
+            self._tree.insert((positions[0], name))
+
+    def _entry(self, name: str):
+        ''' The JSON friendly definition of name for :py:meth:`export_usage` '''
+        raise NotImplementedError
+
+    def _define(self, name: str, entry) -> None:
+        ''' Define name from an exported entry unless it is already defined '''
+        raise NotImplementedError
+
+    def export_usage(self) -> Dict:
+        ''' Export the names used so far, in the order they were numbered,
+        together with their definitions.
+
+        The result only contains strings, lists and dictionaries so it can
+        be written out with :code:`json.dump` by a worker process and later
+        combined with the logs of other workers using
+        :py:func:`jocument.merge_usage`.
+
+        Returns:
+            A dictionary with the keys :code:`names` and :code:`entries`.
+            Names numbered by :py:meth:`load_usage` but not defined here
+            have no entry.
+        '''
+        names = self._ordered_names()
+        defined = self._defined()
+        return {'names': names,
+                'entries': {name: self._entry(name) for name in names if name in defined}}
+
+    def load_usage(self, usage: Dict) -> None:
+        ''' Replace the numbering with the one in a usage log.
+
+        This is normally a log produced by :py:func:`jocument.merge_usage`
+        so that each chapter, re-rendered after loading it, uses the same
+        numbers that a sequential run of the whole book would have.
+        Definitions in the log are only used for names that have not been
+        defined locally.  Names in the log which aren't defined at all, such
+        as the names of other chapters in the log of a
+        :py:class:`jocument.BookRegistry`, keep their numbers but aren't
+        output.  Names which are not in the log are numbered after it when
+        they are first used.
+
+        Args:
+            usage: A dictionary as returned by :py:meth:`export_usage`
+        '''
+        if self._tree is not None:
+            raise ValueError('A usage log can\'t be loaded when numbering by '
+                             'document position')
+        for name, entry in usage['entries'].items():
+            self._define(name, entry)
+        names = list(usage['names'])
+        numbers = {name: index + 1 for index, name in enumerate(names)}
+        if self._lock is None:
+            self.names, self._numbers = names, numbers
+        else:
+            with self._lock:
+                self.names, self._numbers = names, numbers
+
+
+def merge_usage(usages: Iterable[Dict]) -> Dict:
+    ''' Merge the usage logs of several workers into one numbering.
+
+    The logs must be given in document order (e.g. chapter order).  Names
+    are numbered in the order of their first use in that sequence so the
+    result is the same as running the chapters one after the other.  Where a
+    name is defined in more than one log the first definition is kept.
+
+    Usage is as follows::
+
+        # In each worker, after executing its chapter
+        json.dump(citations.export_usage(), open(f'chapter{n}.json', 'w'))
+
+        # Then, once all the workers have finished
+        merged = merge_usage(json.load(open(f'chapter{n}.json'))
+                             for n in range(chapters))
+
+        # And when re-rendering any chapter
+        citations.load_usage(merged)
+
+    Args:
+        usages: The dictionaries returned by
+            :py:meth:`Footnotes.export_usage`, :py:meth:`Citations.export_usage`
+            or :py:meth:`Labels.export_usage`
+
+    Returns:
+        A usage log which can be passed to :code:`load_usage`
+    '''
+    names: List = []
+    seen = set()
+    entries: Dict = {}
+    for usage in usages:
+        for name in usage['names']:
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+            if name not in entries and name in usage['entries']:
+                entries[name] = usage['entries'][name]
+    return {'names': names, 'entries': entries}
+
+
+def _single_line(note_text: str) -> str:
+    return note_text.replace('\n', ' ')
+
+
+class Footnotes(_References):
     ''' A little class to do footnotes (or strictly end notes)
 
         Usage is as follows::
@@ -239,48 +755,90 @@ class Footnotes():
         The default template inserts a numeric
         reference to the note in superscript
         with a hyperlink to the correct footnote.
+
+        Args:
+            styler: A :py:class:`jocument.JocumentStyle` object if the
+                footnote format needs to be customised.
+            threadsafe: Defaults to False.  Set this to True if the
+                footnotes are shared between threads so that each footnote
+                is numbered exactly once.
+            ordered: Defaults to False.  Set this to True to number the
+                footnotes by their position in the document rather than by
+                first use.  A :code:`position` must then be passed when
+                referencing them.
+            on_missing: Defaults to 'render', which puts a message in the
+                text where a name isn't found, suggesting the nearest names.
+                'log' also logs a warning and 'raise' raises a KeyError.
     '''
 
-    def __init__(self, styler: JocumentStyle = None):
-        if styler is None:
-            self.styler: JocumentStyle = JocumentStyle()
-        else:
-            self.styler = styler
-        self.names: List = []
+    def __init__(self, styler: JocumentStyle = None, threadsafe: bool = False,
+                 ordered: bool = False, on_missing: str = 'render'):
+        super().__init__(styler, threadsafe, ordered, on_missing)
         self.name_fn_map: Dict = {}
 
-    def add(self, name: str, note_text: str) -> None:
+    def _defined(self) -> Iterable[str]:
+        return self.name_fn_map.keys()
+
+    def add(self, name: str, note_text: Union[str, Callable[[], str]]) -> None:
         ''' Make a new footnote
 
         Args:
             name: A friendly name that you can use in the text
-            note_text: The footnote text.
+            note_text: The footnote text.  If the text is expensive to work
+                out then pass a function taking no arguments which returns
+                it instead.  It is only called, once, when the footnote is
+                referenced or output.
 
         Returns:
             None
         '''
-        self.name_fn_map[name] = note_text.replace('\n', ' ')
+        if self.stats is not None:
+            self.stats.call('add')
+        if callable(note_text):
+            self.name_fn_map[name] = note_text
+        else:
+            self.name_fn_map[name] = _single_line(note_text)
+        self._forget_escaped(name)
+        self._register(name)
+
+    def _text(self, name: str) -> str:
+        ''' The text of a footnote, evaluating it if it is lazy '''
+        return self._resolve(self.name_fn_map, name,
+                             lambda note_text: _single_line(note_text()))
+
+    def _entry(self, name: str) -> str:
+        return self._text(name)
 
-    def ref(self, name: str) -> str:
+    def _define(self, name: str, entry: str) -> None:
+        self.name_fn_map.setdefault(name, entry)
+
+    def ref(self, name: str, position: Any = None) -> str:
         ''' Reference the footnote in the text
 
         Args:
             name: The friendly name.
+            position: The position in the document, e.g.
+                :code:`(cell index, offset)`.  Required if the footnotes
+                are numbered by document position, and recorded in the usage
+                index if it is enabled.
 
         Returns:
             The html for the reference.  Calls
             :py:class:`JocumentStyle.footnote_reference`
         '''
-        try:
-            if name not in self.names:
-                self.names.append(name)
-            number = self.names.index(name) + 1
-            return self.styler.footnote_reference(number, name,
-                                                  self.name_fn_map[name])
-        except ValueError:
-            return '<sup>**"{}" not found**</sup>'.format(name)
-
-    def num(self, name: str) -> str:
+        if self.stats is not None:
+            self.stats.call('ref')
+        if name not in self.name_fn_map:
+            if self.stats is not None:
+                self.stats.miss('ref')
+            return self._missing(name, '<sup>**"{name}" not found{hint}**</sup>')
+        number = self._number(name, position)
+        if self.usage is not None:
+            self.usage.record(name, position)
+        return self.styler.footnote_reference(
+            number, name, self._escaped_text(self.styler, name, self._text(name)))
+
+    def num(self, name: str, position: Any = None) -> str:
         ''' Output the number of the footnote to refer to it in the text.
 
             This would be used where you have already defined the footnote and
@@ -290,18 +848,21 @@ class Footnotes():
 
         Args:
             name (str): The friendly name.
+            position: The position in the document.  See :py:meth:`ref`
 
         Returns:
             Just the numeric identifier of the footnote.
             Calls :py:meth:`JocumentStyle.footnote_number`
         '''
-        try:
-            if name not in self.names:
-                self.names.append(name)
-            number = self.names.index(name) + 1
-            return self.styler.footnote_number(number)
-        except ValueError:
-            return '** Footnote "{}" not found**'.format(name)
+        if self.stats is not None:
+            self.stats.call('num')
+        if name not in self.name_fn_map:
+            if self.stats is not None:
+                self.stats.miss('num')
+            return self._missing(name, '** Footnote "{name}" not found{hint}**')
+        if self.usage is not None:
+            self.usage.record(name, position)
+        return self.styler.footnote_number(self._number(name, position))
 
     def output(self) -> str:
         ''' Output the all the footnotes suitably formatted
@@ -314,16 +875,84 @@ class Footnotes():
         Returns:
             The html for all the footnotes
         '''
-        html = [self.styler.footnotes_start()]
-        for index, name in enumerate(self.names):
+        return self._output(self._render_output([self.styler])[0])
+
+    def output_targets(self, targets: Dict[str, JocumentStyle]) -> Dict[str, str]:
+        ''' Output all the footnotes for several stylers at once, e.g. to
+            publish HTML, LaTeX and Markdown from one notebook.  The
+            footnotes are visited, and lazy ones evaluated, only once.
+
+        Args:
+            targets: A styler for each target, e.g.
+                :code:`{'html': JocumentStyle(), 'latex': LatexStyle()}`.
+                See :py:mod:`jocument.targets`
+
+        Returns:
+            The output for each target, keyed like targets
+        '''
+        return self._output_targets(targets, self._render_output)
+
+    def _render_output(self, stylers: List[JocumentStyle]) -> List[List[str]]:
+        ''' The parts of the output of each styler '''
+        html = [[styler.footnotes_start()] for styler in stylers]
+        for index, name in enumerate(self._ordered_names()):
+            if name not in self.name_fn_map:
+                # Numbered by load_usage but defined in another notebook
+                continue
             number = index + 1
-            text = self.name_fn_map[name]
-            html.append(self.styler.footnote_output(number, name, text))
-        html.append(self.styler.footnotes_end())
-        return ''.join(html)
+            text = self._text(name)
+            for parts, styler in zip(html, stylers):
+                parts.append(styler.footnote_output(number, name,
+                                                    self._escaped_text(styler, name, text)))
+        for parts, styler in zip(html, stylers):
+            parts.append(styler.footnotes_end())
+        return html
+
+
+_NON_ALPHANUMERIC_RE = re.compile(r'[\W_]+')
+
+
+_YEAR_RE = re.compile(r'\b(1\d{3}|20\d{2})\b')
+
+# The orders of Citations.output and the fields of the collation key they sort by
+CITATION_ORDERS = {'author': operator.itemgetter(0, 2, 1),
+                   'title': operator.itemgetter(1, 0, 2),
+                   'year': operator.itemgetter(2, 0, 1)}
+
+
+def _field_text(field: Any) -> str:
+    ''' A citation field as a string, e.g. a year given as a number, or ''
+        for None
+    '''
+    return '' if field is None else str(field)
+
+
+def _normalise(field: Any) -> str:
+    ''' A field ignoring case, accents, punctuation and spacing '''
+    return _NON_ALPHANUMERIC_RE.sub(' ', unicodedata.normalize('NFKD', _field_text(field))
+                                    .encode('ascii', 'ignore').decode('ascii')
+                                    .casefold()).strip()
+
+
+def _work_key(reference: Tuple) -> Tuple:
+    ''' The normalised (author, title, source) used to spot the same work
+        stored under different names.  Case, accents, punctuation and
+        spacing are ignored.
+    '''
+    return tuple(_normalise(field) for field in reference)
+
+
+def _collation_key(reference: Tuple) -> Tuple:
+    ''' The normalised (author, title, year) which citations are sorted by.
+        The year is the last one in the source, and citations without one
+        sort after those with one.
+    '''
+    years = _YEAR_RE.findall(_field_text(reference[2]))
+    return (_normalise(reference[0]), _normalise(reference[1]),
+            int(years[-1]) if years else float('inf'))
 
 
-class Citations():
+class Citations(_References):
     ''' A little class to do citations.
 
         For example, in a jupyter notebook, one can have a code cell at the top
@@ -356,21 +985,49 @@ class Citations():
         Args:
             styler: A :py:class:`jocument.JocumentStyle` object if the
                 citation format needs to be customised.
+            threadsafe: Defaults to False.  Set this to True if the
+                citations are shared between threads so that each citation
+                is numbered exactly once.
+            ordered: Defaults to False.  Set this to True to number the
+                citations by their position in the document rather than by
+                first use.  A :code:`position` must then be passed when
+                referencing them.
+            deduplicate: Defaults to False.  If True then a citation with the
+                same author, title and source as an earlier one (ignoring
+                case, accents, punctuation and spacing) becomes an alias for
+                it, so both names cite the same number and the work is only
+                output once.  The aliases are in :code:`aliases`.  Citations
+                with lazy fields are not checked, and a work already cited
+                under two names keeps both numbers.
+            on_missing: Defaults to 'render', which puts a message in the
+                text where a name isn't found, suggesting the nearest names.
+                'log' also logs a warning and 'raise' raises a KeyError.
     '''
 
-    def __init__(self, styler: 'JocumentStyle' = None):
-
-        if styler is None:
-            self.styler: JocumentStyle = JocumentStyle()
-        else:
-            self.styler: JocumentStyle = styler
+    def __init__(self, styler: 'JocumentStyle' = None, threadsafe: bool = False,
+                 ordered: bool = False, deduplicate: bool = False,
+                 on_missing: str = 'render'):
+        super().__init__(styler, threadsafe, ordered, on_missing)
         self.references: Dict = {}
-        self.names: List = []
-
-    def reference(self, name: str, author: str = '', title: str = '',
-                  source: str = '') -> None:
+        self.aliases: Dict[str, str] = {}
+        # The first name stored for each normalised work and the key of each name
+        self._work_index: Dict = {} if deduplicate else None
+        self._work_keys: Dict = {}
+        # The collation key of each name, see _collation_key
+        self._collation_keys: Dict = {}
+
+    def _defined(self) -> Iterable[str]:
+        return self.references.keys()
+
+    def reference(self, name: str, author: Union[str, Callable[[], str]] = '',
+                  title: Union[str, Callable[[], str]] = '',
+                  source: Union[str, Callable[[], str]] = '') -> None:
         ''' Store a citation keyed by name.
 
+        Any of author, title and source can instead be a function taking no
+        arguments which returns the string.  They are only called, once,
+        when the citation is cited or output.
+
         Args:
             name: the friendly name or this citation
             author: The author or authors of the paper
@@ -379,9 +1036,70 @@ class Citations():
         Returns:
             None
         '''
+        if self.stats is not None:
+            self.stats.call('reference')
         self.references[name] = (author, title, source)
-
-    def cite(self, name: str) -> str:
+        self._forget_escaped(name)
+        if self._work_index is not None:
+            self._index_work(name)
+        self._collation_keys.pop(name, None)
+        self._register(name)
+
+    def _index_work(self, name: str) -> None:
+        ''' Add name to the index of works, making it an alias if it is a duplicate.
+
+        If name was the first name of a different work, the next of that
+        work's aliases takes over.  A name which has already been cited
+        keeps its number, so it only becomes an alias if the first name of
+        its work hasn't been cited, and then that name becomes its alias
+        instead.
+        '''
+        reference = self.references[name]
+        key = None if _is_lazy(reference) else _work_key(reference)
+        old_key = self._work_keys.pop(name, None)
+        if old_key is not None and old_key != key and self._work_index.get(old_key) == name:
+            del self._work_index[old_key]
+            self._repoint_aliases(name, old_key)
+        self.aliases.pop(name, None)
+        if key is None:
+            return
+        self._work_keys[name] = key
+        canonical = self._work_index.setdefault(key, name)
+        if canonical == name:
+            return
+        if self._lookup(name) is None:
+            self.aliases[name] = canonical
+        elif self._lookup(canonical) is None:
+            self._work_index[key] = name
+            self._repoint_aliases(canonical, key, name)
+            self.aliases[canonical] = name
+
+    def _repoint_aliases(self, canonical: str, key: Tuple, new_canonical: str = None) -> None:
+        ''' Point the aliases of canonical at new_canonical, or if that isn't
+            given make the first of them the first name of the work
+        '''
+        aliases = [alias for alias, target in self.aliases.items() if target == canonical]
+        if new_canonical is None:
+            if not aliases:
+                return
+            new_canonical = aliases.pop(0)
+            del self.aliases[new_canonical]
+            self._work_index[key] = new_canonical
+        for alias in aliases:
+            self.aliases[alias] = new_canonical
+
+    def _reference(self, name: str) -> Tuple:
+        ''' The (author, title, source) of a citation, evaluating any lazy fields '''
+        return self._resolve(self.references, name,
+                             lambda ref: tuple(_call(field) for field in ref))
+
+    def _entry(self, name: str) -> List:
+        return list(self._reference(name))
+
+    def _define(self, name: str, entry: List) -> None:
+        self.references.setdefault(name, tuple(entry))
+
+    def cite(self, name: str, position: Any = None) -> str:
         ''' Reference the citation in the text
 
         Returns the citation formatted using
@@ -389,18 +1107,34 @@ class Citations():
 
         Args:
             name: The friendly name for this citation
-
+            position: The position in the document, e.g.
+                :code:`(cell index, offset)`.  Required if the citations
+                are numbered by document position, and recorded in the usage
+                index if it is enabled.  The use is recorded under name as
+                written, even if it is an alias of another citation.
         '''
-        try:
-            if name not in self.names:
-                self.names.append(name)
-            number = self.names.index(name) + 1
-            return self.styler.cite(number, name, self.references[name])
-
-        except ValueError:
-            return f'**Citation "{name}" not found**'
+        if self.stats is not None:
+            self.stats.call('cite')
+        if name not in self.references:
+            if self.stats is not None:
+                self.stats.miss('cite')
+            return self._missing(name, '**Citation "{name}" not found{hint}**')
+        if self.usage is not None:
+            self.usage.record(name, position)
+        name = self.aliases.get(name, name)
+        return self.styler.cite(self._number(name, position), name,
+                                self._escaped_text(self.styler, name, self._reference(name)))
+
+    def _collation_key(self, name: str) -> Tuple:
+        ''' The collation key of a citation, worked out the first time it
+            is needed and then kept until the citation is stored again
+        '''
+        key = self._collation_keys.get(name)
+        if key is None:
+            key = self._collation_keys[name] = _collation_key(self._reference(name))
+        return key
 
-    def output(self) -> str:
+    def output(self, order: str = 'cite') -> str:
         ''' Output the all the citations suitably formatted
 
         All the references are output.  First the
@@ -408,16 +1142,61 @@ class Citations():
         called then for each reference,
         :py:meth:`JocumentStyle.reference_output` is called
         and then finally :py:meth:`JocumentStyle.references_end`
+
+        Args:
+            order: 'cite' lists the citations by their number.  'author',
+                'title' and 'year' sort them by that field, ignoring case,
+                accents and punctuation, then by the others.  Each
+                citation keeps its number so the links from :py:meth:`cite`
+                still match.  The key of each citation is worked out the
+                first time it is sorted and kept, so later sorts are a
+                single keyed sort.
         '''
-        html = [self.styler.references_start()]
-        for index, name in enumerate(self.names):
-            html.append(self.styler.reference_output(index + 1, name,
-                                                     self.references[name]))
-        html.append(self.styler.references_end())
-        return ''.join(html)
+        return self._output(self._render_output([self.styler], order)[0])
+
+    def output_targets(self, targets: Dict[str, JocumentStyle],
+                       order: str = 'cite') -> Dict[str, str]:
+        ''' Output all the citations for several stylers at once, e.g. to
+            publish HTML, LaTeX and Markdown from one notebook.  The
+            citations are visited and sorted, and lazy ones evaluated, only
+            once.
 
+        Args:
+            targets: A styler for each target, e.g.
+                :code:`{'html': JocumentStyle(), 'latex': LatexStyle()}`.
+                See :py:mod:`jocument.targets`
+            order: As for :py:meth:`output`
 
-class Labels():
+        Returns:
+            The output for each target, keyed like targets
+        '''
+        return self._output_targets(targets,
+                                    lambda stylers: self._render_output(stylers, order))
+
+    def _render_output(self, stylers: List[JocumentStyle], order: str) -> List[List[str]]:
+        ''' The parts of the output of each styler '''
+        if order != 'cite' and order not in CITATION_ORDERS:
+            raise ValueError(f'order must be "cite" or one of {tuple(CITATION_ORDERS)}')
+        # Leaving out names numbered by load_usage but defined in another notebook
+        numbered = [(number, name) for number, name in enumerate(self._ordered_names(), 1)
+                    if name in self.references]
+        if order != 'cite':
+            fields = CITATION_ORDERS[order]
+            keys = [fields(self._collation_key(name)) for _, name in numbered]
+            numbered = [item for _, item in sorted(zip(keys, numbered),
+                                                   key=operator.itemgetter(0))]
+        html = [[styler.references_start()] for styler in stylers]
+        for number, name in numbered:
+            reference = self._reference(name)
+            for parts, styler in zip(html, stylers):
+                parts.append(styler.reference_output(
+                    number, name, self._escaped_text(styler, name, reference)))
+        for parts, styler in zip(html, stylers):
+            parts.append(styler.references_end())
+        return html
+
+
+class Labels(_References):
     ''' A little class to do equation and table and figure numbering.
 
         Usage is as follows::
@@ -430,7 +1209,10 @@ class Labels():
 
         .. note::
             Optionally, a :py:class:`jocument.JocumentStyle` object can be passed
-            in if customised formatting is required.
+            in if customised formatting is required.  Unlike
+            :py:class:`Footnotes` and :py:class:`Citations` there is no
+            :code:`output` or :code:`output_targets`, so to render labels as
+            LaTeX or Markdown pass a styler from :py:mod:`jocument.targets`.
 
         For example, in a jupyter notebook, one can have a markdown cell
         after a table or a graph containing the markdown::
@@ -462,18 +1244,42 @@ class Labels():
         Args:
             reference_type: The string (which will be displayed) for this type
             styler: :py:class:`jocument.JocumentStyle` object.
+            threadsafe: Defaults to False.  Set this to True if the
+                labels are shared between threads so that each label
+                is numbered exactly once.
+            ordered: Defaults to False.  Set this to True to number the
+                labels by their position in the document rather than by
+                first use.  A :code:`position` must then be passed when
+                adding them.
+            on_missing: Defaults to 'render', which puts a message in the
+                text where a name isn't found, suggesting the nearest names.
+                'log' also logs a warning and 'raise' raises a KeyError.
+            sections: A :py:class:`jocument.sections.Sections`, normally
+                :py:data:`jocument.sections.SECTIONS` which the
+                :code:`%sectionpage` and :code:`%pageheader` magics advance.
+                If given, labels are numbered within the section they are
+                first used in, e.g. "Figure 4.3", and the styler is passed a
+                :py:class:`jocument.sections.LabelNumber` as the number.
+                Can't be combined with ordered.
     '''
 
-    def __init__(self, reference_type: str, styler: JocumentStyle = None):
-        if styler is None:
-            self.styler: JocumentStyle = JocumentStyle()
-        else:
-            self.styler: JocumentStyle = styler
-        self.names: List = []
+    def __init__(self, reference_type: str, styler: JocumentStyle = None,
+                 threadsafe: bool = False, ordered: bool = False,
+                 on_missing: str = 'render', sections: Sections = None):
+        if ordered and sections is not None:
+            raise ValueError('Labels can\'t be numbered both by document position '
+                             'and by section')
+        super().__init__(styler, threadsafe, ordered, on_missing)
+        self._counters: SectionCounters = (SectionCounters(sections)
+                                           if sections is not None else None)
         self.name_title_map: Dict = {}
+        # Shared with the other Labels of a LabelRegistry, if there is one
+        self._name_index: Dict = None
+        self._registry_trigrams: TrigramIndex = None
         self.reference_type: str = reference_type
 
-    def add(self, name: str, title: str, forward: int = False) -> str:
+    def add(self, name: str, title: str, forward: int = False,
+            position: Any = None) -> str:
         ''' Make a new label.
 
         Args:
@@ -483,32 +1289,221 @@ class Labels():
                             before it the caption is output then
                             set this to true.
             title (str): The optional title to the table/chart/equation
+            position: The position in the document, e.g.
+                :code:`(cell index, offset)`.  Only used, and required, if
+                the labels are numbered by document position.
 
         Returns (str):
             If forward is True, returns the styler table_ref
             html (default is <Reference Type> [num])
             If forward is False, returns the styler.label html
         '''
-        if name not in self.names:
-            self.names.append(name)
+        if self.stats is not None:
+            self.stats.call('add')
+        if self._name_index is not None:
+            owner = self._name_index.setdefault(name, self)
+            if owner is not self:
+                return f'**"{name}" is already a {owner.reference_type}**'
         self.name_title_map[name] = title
+        self._register(name)
+        number = self._number(name, position)
         if forward:
-            return self.ref(name)
+            return self.ref(name, position)
         else:
-            number = self.names.index(name) + 1
-            return self.styler.label(self.reference_type, number, name, title)
-
-    def ref(self, name: str) -> str:
+            return self.styler.label(self.reference_type, number, name,
+                                     self.styler.escape_text(title))
+
+    def _register(self, name: str) -> None:
+        super()._register(name)
+        if self._registry_trigrams is not None:
+            self._registry_trigrams.add(name)
+
+    def _append(self, name: str) -> int:
+        ''' Number a new name in its section if numbering by section '''
+        if self._counters is None:
+            return super()._append(name)
+        number = self._counters.next()
+        self.names.append(name)
+        self._numbers[name] = number
+        return number
+
+    def load_usage(self, usage: Dict) -> None:
+        if self._counters is not None:
+            raise ValueError('A usage log can\'t be loaded when numbering by section')
+        super().load_usage(usage)
+
+    def _entry(self, name: str) -> str:
+        return self.name_title_map[name]
+
+    def _defined(self) -> Iterable[str]:
+        return self.name_title_map.keys()
+
+    def _define(self, name: str, entry: str) -> None:
+        self.name_title_map.setdefault(name, entry)
+
+    def ref(self, name: str, position: Any = None) -> str:
         ''' Get a reference to a label
 
         Args:
             name (str): The friendly name for the label
+            position: The position of the reference in the document, e.g.
+                :code:`(cell index, offset)`, recorded in the usage index
+                if it is enabled.  Defaults to the count of earlier
+                references to the label in the same cell.
 
         Returns (str):
             returns the styler.label html
         '''
-        try:
-            number = self.names.index(name) + 1
-            return self.styler.label_ref(self.reference_type, number)
-        except ValueError:
-            return f'**{self.reference_type} "{name}" not defined**'
+        if self.stats is not None:
+            self.stats.call('ref')
+        number = self._lookup(name)
+        if number is None:
+            if self.stats is not None:
+                self.stats.miss('ref')
+            reference_type = self.reference_type.replace('{', '{{').replace('}', '}}')
+            return self._missing(name, '**' + reference_type + ' "{name}" not defined{hint}**')
+        if self.usage is not None:
+            self.usage.record(name, position)
+        return self.styler.label_ref(self.reference_type, number)
+
+
+class LabelRegistry():
+    ''' Several types of :py:class:`Labels` sharing one index of names.
+
+        Usage is as follows::
+
+            labels = LabelRegistry(['Figure', 'Table', 'Equation'])
+
+        and then in the markdown::
+
+            {{labels.add('Figure', 'growth_chart', title='Growth')}}
+
+        Later on in the text the label can be referred to without saying
+        what type it is::
+
+            {{labels.ref('growth_chart')}}
+
+        which looks the name up in the shared index and calls
+        :py:meth:`JocumentStyle.label_ref` with "Figure".  Each type is also
+        available as an ordinary :py:class:`Labels` object as
+        :code:`labels['Figure']`.  A name can only belong to one type.
+
+        Args:
+            reference_types: The strings (which will be displayed) for
+                each type
+            styler: :py:class:`jocument.JocumentStyle` object shared by
+                all the types.
+            threadsafe: Defaults to False.  Passed on to each
+                :py:class:`Labels`.
+            sections: Defaults to None.  Passed on to each :py:class:`Labels`
+                so that every type is numbered within sections.
+            on_missing: Defaults to 'render'.  Passed on to each
+                :py:class:`Labels` and also used by :py:meth:`ref` when a
+                name isn't a label of any type, suggesting the nearest
+                names of every type.
+    '''
+
+    def __init__(self, reference_types: Iterable[str], styler: JocumentStyle = None,
+                 threadsafe: bool = False, sections: Sections = None,
+                 on_missing: str = 'render'):
+        if on_missing not in ON_MISSING:
+            raise ValueError(f'on_missing must be one of {ON_MISSING}')
+        if styler is None:
+            self.styler: JocumentStyle = JocumentStyle()
+        else:
+            self.styler = styler
+        self.on_missing: str = on_missing
+        self.name_index: Dict = {}
+        self.labels: Dict = {}
+        self._trigrams: TrigramIndex = None
+        for reference_type in reference_types:
+            labels = Labels(reference_type, self.styler, threadsafe,
+                            on_missing=on_missing, sections=sections)
+            labels._name_index = self.name_index #pylint: disable=protected-access
+            self.labels[reference_type] = labels
+
+    def __getitem__(self, reference_type: str) -> Labels:
+        return self.labels[reference_type]
+
+    def add(self, reference_type: str, name: str, title: str = None,
+            forward: bool = False, position: Any = None) -> str:
+        ''' Make a new label of the given type.
+
+        See :py:meth:`Labels.add`
+        '''
+        return self.labels[reference_type].add(name, title, forward, position)
+
+    def resolve(self, name: str) -> Tuple[str, int]:
+        ''' The type and number of a label.
+
+        Args:
+            name (str): The friendly name for the label
+
+        Returns:
+            A tuple of the reference type and the number, or None if
+            the name hasn't been added.
+        '''
+        labels = self.name_index.get(name)
+        if labels is None:
+            return None
+        return labels.reference_type, labels._lookup(name) #pylint: disable=protected-access
+
+    def ref(self, name: str, position: Any = None) -> str:
+        ''' Get a reference to a label of any type
+
+        Args:
+            name (str): The friendly name for the label
+            position: See :py:meth:`Labels.ref`
+
+        Returns (str):
+            returns the styler.label_ref html for the type of the label
+        '''
+        labels = self.name_index.get(name)
+        if labels is None:
+            return _missing(type(self).__name__, self.on_missing, name,
+                            '**Label "{name}" not defined{hint}**', self.suggest(name))
+        return labels.ref(name, position)
+
+    def suggest(self, name: str, limit: int = 3) -> List[str]:
+        ''' The names of any type nearest to name.
+
+        See :py:meth:`Labels.suggest`
+        '''
+        if self._trigrams is None:
+            trigrams = TrigramIndex()
+            for labels in self.labels.values():
+                labels._registry_trigrams = trigrams #pylint: disable=protected-access
+            for defined in list(self.name_index):
+                trigrams.add(defined)
+            self._trigrams = trigrams
+        return self._trigrams.nearest(name, limit)
+
+    def enable_usage_index(self, cell: Callable[[], Any] = None) -> UsageIndex:
+        ''' Start recording where each label is referenced, in one
+            :py:class:`jocument.indexes.UsageIndex` shared by all the types.
+
+        See :py:meth:`Labels.enable_usage_index`
+        '''
+        usage = None
+        for labels in self.labels.values():
+            if labels.usage is not None:
+                usage = labels.usage
+        if usage is None:
+            usage = UsageIndex() if cell is None else UsageIndex(cell)
+        for labels in self.labels.values():
+            labels.usage = usage
+        return usage
+
+    def where_used(self, name: str) -> List[Tuple]:
+        ''' The (cell id, position) of each reference to a label of any type '''
+        labels = self.name_index.get(name)
+        return labels.where_used(name) if labels is not None else []
+
+    def complete(self, prefix: str, limit: int = None) -> List[str]:
+        ''' The names of any type starting with prefix, in sorted order.
+
+        See :py:meth:`Labels.complete`
+        '''
+        names = sorted(name for labels in self.labels.values()
+                       for name in labels.complete(prefix, limit))
+        return names if limit is None else names[:limit]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Sections documentation
+
+Section scoped numbering of labels, e.g. "Figure 4.3" for the third figure
+of the fourth section.  The :code:`%sectionpage` and :code:`%pageheader`
+magics start a new section of :py:data:`SECTIONS`, so::
+
+    figures = Labels('Figure', sections=SECTIONS)
+
+numbers the figures within the section they are added in.
+"""
+import threading
+from typing import Dict, Hashable, NamedTuple, Tuple
+
+
+class LabelNumber(NamedTuple):
+    ''' The number of a label within its section.
+
+        It is passed to :py:meth:`jocument.JocumentStyle.label` and
+        :py:meth:`jocument.JocumentStyle.label_ref` in place of the plain
+        number and formats as "4.3", or just "3" before the first section.
+    '''
+    section: int
+    number: int
+
+    def __str__(self):
+        if self.section == 0:
+            return str(self.number)
+        return f'{self.section}.{self.number}'
+
+
+class Sections():
+    ''' A counter of the sections of a document.
+
+        A section can be started with a key, such as its title.  Starting a
+        section with a key that has been seen before goes back to that
+        section rather than starting a new one, so a markdown cell holding
+        :code:`{{%sectionpage ...}}` can be rendered again, or a notebook
+        run again, without the sections being renumbered.
+
+        Args:
+            started_by: The names of the magics which start a new section
+    '''
+
+    def __init__(self, started_by: Tuple[str, ...] = ('sectionpage', 'pageheader')):
+        self.started_by: Tuple[str, ...] = started_by
+        self.current: int = 0
+        self._keys: Dict[Hashable, int] = {}
+        self._count: int = 0
+        self._lock = threading.Lock()
+
+    def start(self, key: Hashable = None) -> int:
+        ''' Start a new section, or go back to the one started with key,
+            and return its number
+        '''
+        with self._lock:
+            if key is not None and key in self._keys:
+                self.current = self._keys[key]
+            else:
+                self._count += 1
+                self.current = self._count
+                if key is not None:
+                    self._keys[key] = self.current
+            return self.current
+
+    def started(self, magic: str, key: Hashable = None) -> None:
+        ''' Start a section if magic is one of started_by '''
+        if magic in self.started_by:
+            self.start((magic, key) if key is not None else None)
+
+    def reset(self) -> None:
+        ''' Go back to before the first section and forget the keys '''
+        with self._lock:
+            self.current = 0
+            self._count = 0
+            self._keys = {}
+
+
+class SectionCounters():
+    ''' The count of labels in each section, so numbering a label is O(1) '''
+
+    def __init__(self, sections: Sections):
+        self.sections: Sections = sections
+        self.counts: Dict[int, int] = {}
+
+    def next(self) -> LabelNumber:
+        ''' The number of a new label in the current section '''
+        section = self.sections.current
+        count = self.counts.get(section, 0) + 1
+        self.counts[section] = count
+        return LabelNumber(section, count)
+
+
+# The sections started by the magics in jocument.styling
+SECTIONS = Sections()
@@ -1,12 +1,35 @@
 '''
 '''
+import functools
+import gzip
+import logging
+import os
+import re
 
 import nbconvert
 import nbformat
 
-from PyQt5.QtWidgets import QApplication
 from bs4 import BeautifulSoup
 
+from jocument.instrumentation import StageMetrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Elements whose text keeps its whitespace when the output is compacted
+PRESERVE_WHITESPACE = ('pre', 'textarea', 'script', 'style')
+_PRESERVED_RE = re.compile(r'<({})\b.*?</\1\s*>'.format('|'.join(PRESERVE_WHITESPACE)),
+                           re.DOTALL | re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'[ \t\n\r\f\v]{2,}|[\t\n\r\f\v]')
+
+# The classes of the %pageheader and %sectionpage magics, where a page may start
+_SECTION_CLASSES = ('pageheader', 'section_page')
+_LOCAL_LINK_RE = re.compile(r'^#.')
+
 
 BLOG_CSS = '''
 <style type="text/css">
@@ -31,36 +54,279 @@ ul {
 '''
 
 
-def strip_and_save_html(html):
+def strip_html(html, metrics=None, compact=False):
     ''' Takes the HTML from converting a notebook to HTML and use Beautiful Soup to
         identify those bits of the file that we want to keep.  These are concatenated
-        and then written out to a file and also copied to the clipboard
-        for more easily paste into the control panel at www.cantabcapital.com
+        after the blog css and returned.
+
+        By default the result is pretty printed.  If compact is True it is
+        written out as is, with runs of whitespace collapsed to a single space
+        except inside the elements in :py:data:`PRESERVE_WHITESPACE`, which is
+        smaller and quicker.  Non-breaking spaces, e.g. from :code:`&nbsp;`,
+        are kept.
+
+        The time and memory of the parse, extract and serialize stages are added
+        to metrics, a :py:class:`jocument.instrumentation.StageMetrics`, if given.
     '''
-    print('Writing specialised blog css')
-    soup = BeautifulSoup(html, 'html.parser')
-    output_soup = BeautifulSoup(BLOG_CSS, 'html.parser')
+    if metrics is None:
+        metrics = StageMetrics(logger)
+    with metrics.stage('parse'):
+        soup = BeautifulSoup(html, 'html.parser')
+        output_soup = BeautifulSoup(BLOG_CSS, 'html.parser')
+    with metrics.stage('extract'):
+        for cell_parts in _extract_cells(soup):
+            for part in cell_parts:
+                output_soup.append(part)
+    with metrics.stage('serialize'):
+        return _serialize(output_soup, compact)
+
+
+def _extract_cells(soup):
+    ''' The parts of each cell that we keep: the rendered markdown and the
+        output areas.
+    '''
+    cells = []
     for i, cell_div in enumerate(soup.find_all(class_="cell")):
-        print('Outputting cell {}'.format(i))
+        logger.debug('Outputting cell %d', i)
+        cell_parts = []
         # Rewrite footnotes
         html_output = cell_div.find(class_="text_cell_render")
         if html_output is not None:
-            output_soup.append(html_output)
-        output_areas = cell_div.find_all(class_="output_subarea")
-        for output_area in output_areas:
-            output_soup.append(output_area)
+            cell_parts.append(html_output)
+        cell_parts.extend(cell_div.find_all(class_="output_subarea"))
+        cells.append(cell_parts)
+    return cells
+
+
+def _serialize(output_soup, compact):
+    if compact:
+        return _compact(output_soup)
     output_lines = output_soup.prettify().splitlines()
+    return '\n'.join(output_lines)
+
+
+def page_name(file_name, index):
+    ''' The file name of a page: file_name for the first page then e.g.
+        report-2.html, report-3.html
+    '''
+    if index == 0:
+        return file_name
+    stem, extension = os.path.splitext(file_name)
+    return f'{stem}-{index + 1}{extension}'
+
+
+def split_pages(html, file_name, cells_per_page=None, max_page_bytes=None,
+                at_sections=False, metrics=None, compact=False):
+    ''' Strip the HTML like :py:func:`strip_html` but split it into pages.
+
+        A new page is started when the current page has cells_per_page cells,
+        when adding the next cell would take it over max_page_bytes, and if
+        at_sections is set before a cell holding a %pageheader or
+        %sectionpage.  A page always has at least one cell, so a single cell
+        bigger than max_page_bytes gets a page of its own.
+
+        Links to an id on another page, such as a footnote reference whose
+        footnote is output on the last page, are rewritten to point at that
+        page, e.g. :code:`href=report-3.html#fn_1`.
+
+        Args:
+            html: The HTML from converting a notebook
+            file_name: The file name of the first page, which the names of
+                the others are based on.  See :py:func:`page_name`
+            cells_per_page: The most cells on a page, or None for no limit
+            max_page_bytes: The most bytes of kept HTML on a page, before
+                serializing, or None for no limit
+            at_sections: Whether to start a page at each page header and
+                section page
+            metrics: As for :py:func:`strip_html`
+            compact: As for :py:func:`strip_html`
+
+        Returns:
+            A list of (file name, stripped HTML) for the pages
+    '''
+    if metrics is None:
+        metrics = StageMetrics(logger)
+    with metrics.stage('parse'):
+        soup = BeautifulSoup(html, 'html.parser')
+    with metrics.stage('extract'):
+        pages = [[]]
+        page_cells = 0
+        page_bytes = 0
+        for cell_parts in _extract_cells(soup):
+            if not cell_parts:
+                continue
+            cell_bytes = 0
+            if max_page_bytes is not None:
+                cell_bytes = sum(len(str(part).encode('utf-8')) for part in cell_parts)
+            if page_cells and (
+                    (cells_per_page is not None and page_cells >= cells_per_page)
+                    or (max_page_bytes is not None
+                        and page_bytes + cell_bytes > max_page_bytes)
+                    or (at_sections and _starts_section(cell_parts))):
+                pages.append([])
+                page_cells = 0
+                page_bytes = 0
+            pages[-1].extend(cell_parts)
+            page_cells += 1
+            page_bytes += cell_bytes
+        names = [page_name(file_name, index) for index in range(len(pages))]
+        _link_pages(pages, names)
+    with metrics.stage('serialize'):
+        stripped_pages = []
+        for name, parts in zip(names, pages):
+            output_soup = BeautifulSoup(BLOG_CSS, 'html.parser')
+            for part in parts:
+                output_soup.append(part)
+            stripped_pages.append((name, _serialize(output_soup, compact)))
+    return stripped_pages
+
+
+def _starts_section(cell_parts):
+    ''' Whether a cell holds a page header or section page '''
+    return any(part.find(class_=_SECTION_CLASSES) is not None
+               or any(name in part.get('class', ()) for name in _SECTION_CLASSES)
+               for part in cell_parts)
+
+
+def _link_pages(pages, names):
+    ''' Point the links to ids on other pages at those pages '''
+    id_pages = {}
+    for index, parts in enumerate(pages):
+        for part in parts:
+            if part.get('id') is not None:
+                id_pages.setdefault(part['id'], index)
+            for tag in part.find_all(id=True):
+                id_pages.setdefault(tag['id'], index)
+    for index, parts in enumerate(pages):
+        for part in parts:
+            for link in part.find_all('a', href=_LOCAL_LINK_RE):
+                target = id_pages.get(link['href'][1:])
+                if target is not None and target != index:
+                    link['href'] = names[target] + link['href']
+
+
+def _compact(soup):
+    ''' Serialize soup without pretty printing and with whitespace collapsed.
+
+        This is done on the serialized string, skipping over the preserved
+        elements, which is much quicker than visiting every string in the soup.
+    '''
+    html = str(soup)
+    parts = []
+    position = 0
+    for match in _PRESERVED_RE.finditer(html):
+        parts.append(_WHITESPACE_RE.sub(' ', html[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_WHITESPACE_RE.sub(' ', html[position:]))
+    return ''.join(parts)
+
+
+def write_html(output_file_path, stripped_html, precompress=()):
+    ''' Write the stripped HTML to a file.
+
+        Args:
+            output_file_path: The path of the .html file
+            stripped_html: The HTML
+            precompress: Any of 'gz' and 'br'.  For each one a compressed copy
+                is also written alongside, e.g. page.html.gz, so that a web server
+                can serve it without compressing on every request.  'br' needs
+                the brotli package.
+    '''
+    data = stripped_html.encode('utf-8')
+    if 'br' in precompress and brotli is None:
+        raise ImportError('The brotli package is needed to write .br files')
+    with open(output_file_path, 'wb') as output_file:
+        output_file.write(data)
+    if 'gz' in precompress:
+        with open(output_file_path + '.gz', 'wb') as output_file:
+            output_file.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if 'br' in precompress:
+        with open(output_file_path + '.br', 'wb') as output_file:
+            output_file.write(brotli.compress(data, mode=brotli.MODE_TEXT))
+
+
+def strip_and_save_html(html, metrics=None, compact=False, precompress=(),
+                        cells_per_page=None, max_page_bytes=None, at_sections=False):
+    ''' Strip the HTML from converting a notebook to HTML with :py:func:`strip_html`.
+        The result is then written out to a file with :py:func:`write_html`
+        and also copied to the clipboard
+        for more easily paste into the control panel at www.cantabcapital.com
+
+        If any of cells_per_page, max_page_bytes or at_sections is given the
+        output is split into pages with :py:func:`split_pages`, written
+        alongside each other, and only the first page is copied.
+
+        The time taken by each stage is logged as JSON at INFO level, with
+        the peak memory and per cell progress at DEBUG level.
+    '''
+    from PyQt5.QtWidgets import QApplication # Only needed for the clipboard
+
+    if metrics is None:
+        metrics = StageMetrics(logger)
     output_file_path = dialog_select_file(title='Output Stripped HTML file Name',
                                           starting_directory=user_home_path(),
                                           for_write=True)
+    if len(output_file_path) != 0 and not output_file_path.endswith('.html'):
+        output_file_path = output_file_path + '.html'
+    if cells_per_page is None and max_page_bytes is None and not at_sections:
+        pages = [(os.path.basename(output_file_path), strip_html(html, metrics, compact))]
+    else:
+        pages = split_pages(html, os.path.basename(output_file_path) or 'page.html',
+                            cells_per_page, max_page_bytes, at_sections, metrics, compact)
     if len(output_file_path) != 0:
-        if not output_file_path.endswith('.html'):
-            output_file_path = output_file_path + '.html'
-        print(f'Writing {output_file_path}')
-        with open(output_file_path, 'wt') as output_file:
-            output_file.write('\n'.join(output_lines))
-    print('Stripped html written to clipboard')
-    QApplication.clipboard().setText('\n'.join(output_lines))
+        with metrics.stage('write'):
+            for name, stripped_html in pages:
+                page_path = os.path.join(os.path.dirname(output_file_path), name)
+                logger.info('Writing %s', page_path)
+                write_html(page_path, stripped_html, precompress)
+    logger.info('Stripped html written to clipboard')
+    QApplication.clipboard().setText(pages[0][1])
+    metrics.emit()
+
+
+def notebook_to_html(notebook, metrics=None):
+    ''' Convert a notebook node to HTML with nbconvert's basic template.
+
+        The time and memory are added to metrics as the 'nbconvert export'
+        stage, if given.
+    '''
+    if metrics is None:
+        metrics = StageMetrics(logger)
+    with metrics.stage('nbconvert export'):
+        (html, resources) = _html_exporter().from_notebook_node(notebook)
+    return html
+
+
+@functools.lru_cache(maxsize=None)
+def _html_exporter():
+    ''' An nbconvert HTML exporter producing the cell divs that strip_html expects.
+        The basic template was renamed classic in nbconvert 6.
+
+        The exporter is made once and reused so its template is only compiled
+        once per process.
+    '''
+    if int(nbconvert.__version__.split('.')[0]) >= 6:
+        return nbconvert.HTMLExporter(template_name='classic')
+    html_exporter = nbconvert.HTMLExporter()
+    html_exporter.template_file = 'basic'
+    return html_exporter
+
+
+def convert_notebook(notebook_path, metrics=None, compact=False):
+    ''' Read a notebook file, convert it to HTML and strip it.
+
+        This needs no dialogs or clipboard so it can be used headless,
+        e.g. in scripts and benchmarks.
+
+        Returns:
+            The stripped HTML as returned by :py:func:`strip_html`
+    '''
+    if metrics is None:
+        metrics = StageMetrics(logger)
+    with metrics.stage('read'):
+        notebook = nbformat.read(notebook_path, as_version=4)
+    return strip_html(notebook_to_html(notebook, metrics), metrics, compact)
 
 
 def get_file_for_blog():
@@ -74,10 +340,12 @@ def get_file_for_blog():
                                          starting_directory=user_home_path())
     if len(input_file_path) == 0:
         return
-    print(f'Reading {input_file_path}')
-    with open(input_file_path, 'rt') as input_file:
-        html = input_file.read()
-    strip_and_save_html(html)
+    logger.info('Reading %s', input_file_path)
+    metrics = StageMetrics(logger)
+    with metrics.stage('read'):
+        with open(input_file_path, 'rt') as input_file:
+            html = input_file.read()
+    strip_and_save_html(html, metrics)
 
 
 def get_script_for_blog():
@@ -93,17 +361,16 @@ def get_script_for_blog():
                                          allow_multiple_selection=False)
     if script_name is None:
         return
-    script = pydb.Script.get(script_name)
-    notebook = nbformat.reads(script.contents, as_version=4)
-    html_exporter = nbconvert.HTMLExporter()
-    html_exporter.template_file = 'basic'
-    # Process the notebook we loaded earlier
-    (html, resources) = html_exporter.from_notebook_node(notebook)
-    strip_and_save_html(html)
+    metrics = StageMetrics(logger)
+    with metrics.stage('read'):
+        script = pydb.Script.get(script_name)
+        notebook = nbformat.reads(script.contents, as_version=4)
+    strip_and_save_html(notebook_to_html(notebook, metrics), metrics)
 
 
 def main():
     ''' The main function.  It's called main because it's the main man '''
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     choices = ['Load HTML from File', 'Load Script']
     if open_single_dropdown_dialog(choices) == choices[1]:
         get_script_for_blog()
@@ -3,31 +3,77 @@
 
 
 """
+import collections
+import concurrent.futures
 import datetime
-from typing import List
+import functools
+import time
+from typing import Dict, List
 
 import IPython
 from IPython.core.magic import Magics, line_magic, magics_class
 
+from jocument.sections import SECTIONS
+
 class JocumentError(TypeError):
     ''' An error from the jocument styling system '''
 
 
 class CenterOutput():
-    ''' Center HTML representation of multiple objects in Jupyter notebook '''
+    ''' Center HTML representation of multiple objects in Jupyter notebook
+
+        The HTML of each object is worked out the first time it is needed and
+        kept, so Jupyter asking for it again doesn't render every object
+        again.  Call :py:meth:`refresh` if the objects have changed.
+
+        Args:
+            args: The objects to center
+            max_workers: If more than 1, render the objects in a thread pool
+                of this many threads.  This helps when rendering releases the
+                GIL or waits on I/O, e.g. fetching images.  The objects must be
+                safe to render from other threads.
+            max_items: If given, only the first max_items objects are rendered
+                and the rest are summarised by type underneath
+    '''
 
-    def __init__(self, *args):
+    def __init__(self, *args, max_workers: int = None, max_items: int = None):
         self.args: List = args
+        self.max_workers: int = max_workers
+        self.max_items: int = max_items
+        self._rendered: Dict[int, str] = {}
+
+    @staticmethod
+    def _render(arg) -> str:
+        if hasattr(arg, '_repr_html_'):
+            return arg._repr_html_() #pylint: disable=protected-access
+        return str(arg)
+
+    def refresh(self) -> None:
+        ''' Forget the HTML kept from earlier renders '''
+        self._rendered = {}
 
     def _repr_html_(self):
         ''' Return the html representation of each object centered '''
-        retlist: List[str] = []
-        for arg in self.args:
-            if hasattr(arg, '_repr_html_'):
-                retlist.append(arg._repr_html_()) #pylint: disable=protected-access
-            else:
-                retlist.append(str(arg))
-        return '\n'.join([f'<center>{x}</center>' for x in retlist])
+        shown = self.args if self.max_items is None else self.args[:self.max_items]
+        missing = [index for index in range(len(shown)) if index not in self._rendered]
+        if self.max_workers is not None and self.max_workers > 1 and len(missing) > 1:
+            with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+                rendered = executor.map(self._render, [shown[index] for index in missing])
+                self._rendered.update(zip(missing, rendered))
+        else:
+            for index in missing:
+                self._rendered[index] = self._render(shown[index])
+        retlist = [f'<center>{self._rendered[index]}</center>' for index in range(len(shown))]
+        if len(shown) < len(self.args):
+            retlist.append(f'<center><i>{self._summary(self.args[len(shown):])}</i></center>')
+        return '\n'.join(retlist)
+
+    @staticmethod
+    def _summary(hidden) -> str:
+        ''' Say how many of each type of object aren't shown '''
+        counts = collections.Counter(type(arg).__name__ for arg in hidden)
+        types = ', '.join(f'{count} {name}' for name, count in counts.most_common())
+        return f'... and {len(hidden)} more not shown ({types})'
 
     def __repr__(self):
         ''' The string representation '''
@@ -35,6 +81,32 @@ class CenterOutput():
                             for arg in self.args])
 
 
+# The invocations, calls of _prepare_return, bytes of HTML/CSS emitted
+# and seconds spent in each magic.  Reported by %jocument_stats
+_MAGIC_STATS: Dict[str, Dict] = {}
+
+
+def _magic_stats(name: str) -> Dict:
+    return _MAGIC_STATS.setdefault(name, {'calls': 0, 'prepare_return': 0,
+                                          'bytes': 0, 'seconds': 0.0})
+
+
+def _counted(magic):
+    ''' Record the invocations of a magic and the time spent in it '''
+    @functools.wraps(magic)
+    def wrapper(self, *args, **kwargs):
+        self._current_magic = magic.__name__ #pylint: disable=protected-access
+        start = time.perf_counter()
+        try:
+            return magic(self, *args, **kwargs)
+        finally:
+            stats = _magic_stats(magic.__name__)
+            stats['calls'] += 1
+            stats['seconds'] += time.perf_counter() - start
+            self._current_magic = None #pylint: disable=protected-access
+    return wrapper
+
+
 @magics_class
 class _JocumentMagics(Magics):
     ''' This is the class that defines all the special magics required for our installation
@@ -50,6 +122,8 @@ class _JocumentMagics(Magics):
             raise JocumentError(f'Expected {expected} arguments in {line}.  Found {len(args)}')
         return args
 
+    _current_magic: str = None
+
     def _prepare_return(self, html: str) -> str:
         ''' Do all the magic required to return the HTML correctly.
 
@@ -62,9 +136,14 @@ class _JocumentMagics(Magics):
                    with a space*.  WTF?
 
         '''
-        return IPython.display.display_html(html.replace('\n', ' ').strip(), raw=True)
+        html = html.replace('\n', ' ').strip()
+        stats = _magic_stats(self._current_magic or '_prepare_return')
+        stats['prepare_return'] += 1
+        stats['bytes'] += len(html.encode('utf-8'))
+        return IPython.display.display_html(html, raw=True)
 
     @line_magic
+    @_counted
     def centerplots(self):
         ''' A little line magic which will horizontally center your matplot output in the
             notebook.  This looks better than left aligned plots.
@@ -79,6 +158,7 @@ class _JocumentMagics(Magics):
         return self._prepare_return(f'<style>{center_css}</style>')
 
     @line_magic
+    @_counted
     def pageheader(self, line: str) -> str:
         ''' Create and display a napkin style PageHeaderContinuation display.
             Called with a single parameter either as
@@ -92,9 +172,11 @@ class _JocumentMagics(Magics):
                 <div class="pageheader">
                     <span class="maintext">{}</span>
             </div>'''.format(args[0])
+        SECTIONS.started('pageheader', line)
         return self._prepare_return(html)
 
     @line_magic
+    @_counted
     def titleblock(self, line: str) -> str:
         ''' Create and display a standard document header display.
 
@@ -121,6 +203,7 @@ class _JocumentMagics(Magics):
         return self._prepare_return(html)
 
     @line_magic
+    @_counted
     def frontpage(self, line: str) -> str:
         ''' Create and display a napkin style FrontPage display.
             Magics only pass the remainder of the line to to pass multiple arguments
@@ -142,9 +225,13 @@ class _JocumentMagics(Magics):
         return self._prepare_return(html)
 
     @line_magic
+    @_counted
     def sectionpage(self, line: str) -> str:
         ''' Create and display a SectionPage display.
             Depends on being able to display HTML in the notebook.
+
+            Starts a new section of :py:data:`jocument.sections.SECTIONS`,
+            as does %pageheader, for labels numbered by section.
         '''
         args: List[str] = self._parse_args(line, 3)
         html = '''
@@ -155,10 +242,12 @@ class _JocumentMagics(Magics):
                     <div class="maintext3">{}</div>
                 </div>
             </div>'''.format(args[0], args[1], args[2])
+        SECTIONS.started('sectionpage', line)
         return self._prepare_return(html)
 
 
     @line_magic
+    @_counted
     def prompt(self, line):
         ''' Set up the prompts.
             Used as
@@ -175,6 +264,7 @@ class _JocumentMagics(Magics):
         return self._prepare_return(output)
 
     @line_magic
+    @_counted
     def j_css(self, filename):
         ''' Output the CSS for the styling bits '''
         css = CSS_PAGE
@@ -186,6 +276,23 @@ class _JocumentMagics(Magics):
                 css = f'<h3 style="textcolor: red"> CSS file {filename} not found'
         self._prepare_return(css)
 
+    @line_magic
+    def jocument_stats(self, line: str = '') -> Dict[str, Dict]:
+        ''' Report what the jocument magics have cost this notebook.
+            Used as
+                %jocument_stats
+            which returns, for each magic, the number of invocations, the
+            number of times HTML was displayed, the bytes of HTML/CSS emitted
+            and the seconds spent.  Repeated %j_css or %centerplots output
+            shows up as a large number of bytes.  Or
+                %jocument_stats reset
+            to set all the counts back to zero.
+        '''
+        if line.strip() == 'reset':
+            _MAGIC_STATS.clear()
+            return None
+        return {name: dict(stats) for name, stats in sorted(_MAGIC_STATS.items())}
+
 # Register our magic functions
 _IPYTHON = IPython.core.getipython.get_ipython()
 if _IPYTHON is not None:
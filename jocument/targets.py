@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Targets documentation
+
+Stylers which render footnotes, citations and labels as LaTeX or Markdown
+rather than HTML.  Either can be passed as the styler of a container, e.g.
+:code:`Footnotes(styler=LatexStyle())`, or several stylers can be rendered
+in one pass with :py:meth:`jocument.Footnotes.output_targets` and
+:py:meth:`jocument.Citations.output_targets`::
+
+    outputs = citations.output_targets({'html': JocumentStyle(),
+                                        'latex': LatexStyle(),
+                                        'markdown': MarkdownStyle()})
+
+The containers store the raw text and each target escapes it itself, so
+the LaTeX gets :code:`\\&` whether or not the container's own styler
+escapes for HTML.  The escaped text is kept for each class of styler and
+:code:`escape` setting, so calling :code:`output_targets` again, even with
+new stylers, doesn't escape it again.
+
+:py:class:`jocument.Labels` have no :code:`output` or :code:`output_targets`
+since there is no list of labels to output.  Their captions and references
+are rendered for one target by passing one of these stylers as their
+styler, e.g. :code:`Labels('Figure', styler=LatexStyle())`.
+
+The LaTeX uses :code:`\\hypertarget` and :code:`\\hyperlink` so needs the
+hyperref package.  The anchors have the same names as in the HTML, e.g.
+:code:`fn_1` and :code:`cite_1`.
+"""
+import re
+from typing import Tuple
+
+from jocument.references import JocumentStyle
+
+_LATEX_ESCAPES = {'&': r'\&', '%': r'\%', '$': r'\$', '#': r'\#', '_': r'\_',
+                  '{': r'\{', '}': r'\}', '~': r'\textasciitilde{}',
+                  '^': r'\textasciicircum{}', '\\': r'\textbackslash{}'}
+_LATEX_SPECIAL_RE = re.compile('|'.join(re.escape(character) for character in _LATEX_ESCAPES))
+
+_MARKDOWN_SPECIAL_RE = re.compile(r'([\\`*_{}\[\]<>#|])')
+
+
+class LatexStyle(JocumentStyle):
+    ''' Render footnotes, citations and labels as LaTeX.
+
+        Footnotes and citations are output as :code:`enumerate` lists
+        with their numbers as the item labels.
+
+        Args:
+            escape: Defaults to True, since characters such as :code:`&`,
+                :code:`%` and :code:`_` are common in text and break LaTeX.
+                The text is escaped the first time it is rendered.
+    '''
+
+    def __init__(self, escape: bool = True):
+        super().__init__(escape)
+
+    def escape_text(self, text: str) -> str:
+        ''' Escape the LaTeX special characters in text if :code:`escape` is set '''
+        if not self.escape or text is None:
+            return text
+        return _LATEX_SPECIAL_RE.sub(lambda match: _LATEX_ESCAPES[match.group(0)], str(text))
+
+    def footnote_reference(self, number: int, name: str, text: str) -> str: #pylint: disable=unused-argument
+        return (rf'\hypertarget{{fnret_{number}}}{{}}'
+                rf'\textsuperscript{{\hyperlink{{fn_{number}}}{{{number}}}}}')
+
+    def footnote_number(self, number: int) -> str:
+        return rf'\hypertarget{{fnret_{number}}}{{}}\hyperlink{{fn_{number}}}{{{number}}}'
+
+    def footnotes_start(self) -> str:
+        return '\\begin{enumerate}\n'
+
+    def footnote_output(self, number: int, name: str, text: str) -> str: #pylint: disable=unused-argument
+        return (rf'\item[{number}.] \hypertarget{{fn_{number}}}{{}}{text} '
+                rf'\hyperlink{{fnret_{number}}}{{$\hookleftarrow$}}' '\n')
+
+    def footnotes_end(self) -> str:
+        return '\\end{enumerate}\n'
+
+    def cite(self, number: int, name: str, reference: Tuple) -> str: #pylint: disable=unused-argument
+        return rf'\hypertarget{{citeret_{number}}}{{}}\hyperlink{{cite_{number}}}{{[{number}]}}'
+
+    def references_start(self) -> str:
+        return '\\begin{enumerate}\n'
+
+    def reference_output(self, number: int, name: str, ref: Tuple) -> str: #pylint: disable=unused-argument
+        return (rf'\item[{{[{number}]}}] \hypertarget{{cite_{number}}}{{}}'
+                rf'\textbf{{{ref[0]}}}, \emph{{{ref[1]}}}, {ref[2]} '
+                rf'\hyperlink{{citeret_{number}}}{{$\hookleftarrow$}}' '\n')
+
+    def references_end(self) -> str:
+        return '\\end{enumerate}\n'
+
+    def label(self, ref_type: str, number: int, name: str, title: str) -> str: #pylint: disable=unused-argument
+        caption = rf'\emph{{{ref_type} {number}}}'
+        if title is not None:
+            caption += rf'\\ \emph{{{title}}}'
+        return (rf'\begin{{center}}\hypertarget{{ref_{ref_type}{number}}}{{}}'
+                rf'{caption}\end{{center}}')
+
+    def label_ref(self, ref_type: str, number: int) -> str:
+        return rf'\hyperlink{{ref_{ref_type}{number}}}{{{ref_type} {number}}}'
+
+
+class MarkdownStyle(JocumentStyle):
+    ''' Render footnotes, citations and labels as Markdown.
+
+        Footnotes use the :code:`[^1]` footnote syntax of Pandoc and GitHub
+        flavoured Markdown.  Citations and labels link to HTML anchors,
+        which Markdown passes through.  The references are output as
+        paragraphs starting with an explicit :code:`[n]` rather than as an
+        ordered list, which Markdown would renumber from 1 when they are
+        sorted or don't start at 1.
+
+        Args:
+            escape: Defaults to False.  If True then the Markdown special
+                characters in the text are backslash escaped when it is
+                rendered.
+    '''
+
+    def escape_text(self, text: str) -> str:
+        ''' Backslash escape the Markdown special characters in text if
+            :code:`escape` is set
+        '''
+        if not self.escape or text is None:
+            return text
+        return _MARKDOWN_SPECIAL_RE.sub(r'\\\1', str(text))
+
+    def footnote_reference(self, number: int, name: str, text: str) -> str: #pylint: disable=unused-argument
+        return f'[^{number}]'
+
+    def footnote_number(self, number: int) -> str:
+        return str(number)
+
+    def footnotes_start(self) -> str:
+        return ''
+
+    def footnote_output(self, number: int, name: str, text: str) -> str: #pylint: disable=unused-argument
+        return f'[^{number}]: {text}\n'
+
+    def footnotes_end(self) -> str:
+        return ''
+
+    def cite(self, number: int, name: str, reference: Tuple) -> str: #pylint: disable=unused-argument
+        return f'[\\[{number}\\]](#cite_{number})'
+
+    def references_start(self) -> str:
+        return ''
+
+    def reference_output(self, number: int, name: str, ref: Tuple) -> str: #pylint: disable=unused-argument
+        return f'<a id="cite_{number}"></a>\\[{number}\\] **{ref[0]}**, *{ref[1]}*, {ref[2]}\n\n'
+
+    def references_end(self) -> str:
+        return ''
+
+    def label(self, ref_type: str, number: int, name: str, title: str) -> str: #pylint: disable=unused-argument
+        caption = f'*{ref_type} {number}*'
+        if title is not None:
+            caption += f': *{title}*'
+        return f'<a id="ref_{ref_type}{number}"></a>{caption}'
+
+    def label_ref(self, ref_type: str, number: int) -> str:
+        return f'[{ref_type} {number}](#ref_{ref_type}{number})'
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Watch documentation
+
+Keep a directory of notebooks published by polling it and re-running the
+stripper on the notebooks which have changed.  No file system notification
+service is needed.
+
+Run with::
+
+    python -m jocument.watch notebooks --output published --compact
+
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Dict, Iterator, List, NamedTuple, Sequence
+
+from jocument.book import _digest
+from jocument.instrumentation import StageMetrics
+from jocument.stripper import convert_notebook, write_html
+
+logger = logging.getLogger(__name__)
+
+# The longest wait, in seconds, before converting a notebook which failed again
+MAX_RETRY_DELAY = 3600.0
+
+
+class _Failure(NamedTuple):
+    ''' A notebook which failed to convert '''
+    digest: str
+    attempts: int
+    retry_at: float
+
+
+class NotebookWatcher():
+    ''' Poll a directory of notebooks and republish the ones that change.
+
+        Each poll only stats the notebooks.  A notebook whose modification time
+        has changed is hashed, and it is only converted if its contents have
+        changed since it was last converted.  To avoid converting a notebook
+        several times while it is being saved, it is only looked at once its
+        modification time is at least :code:`debounce` seconds old.
+
+        When the watcher starts, notebooks whose published HTML is newer
+        than the notebook are not converted again.
+
+        A notebook which fails to convert is converted again as soon as its
+        contents change.  If they don't, it is retried after twice the
+        interval, then four times and so on up to :py:data:`MAX_RETRY_DELAY`,
+        in case the failure was passing, e.g. a full disk.  Only the first
+        failure of the same contents is logged with a traceback.
+
+        Args:
+            directory: The directory searched (recursively) for .ipynb files
+            output_directory: Where the HTML is written, mirroring the layout
+                of directory.  Defaults to directory.
+            interval: Seconds between polls
+            debounce: Seconds a notebook must be unmodified before converting
+            compact: Passed to :py:func:`jocument.stripper.strip_html`
+            precompress: Passed to :py:func:`jocument.stripper.write_html`
+    '''
+
+    def __init__(self, directory: str, output_directory: str = None,
+                 interval: float = 1.0, debounce: float = 2.0,
+                 compact: bool = False, precompress: Sequence[str] = ()):
+        self.directory: str = directory
+        self.output_directory: str = output_directory or directory
+        self.interval: float = interval
+        self.debounce: float = debounce
+        self.compact: bool = compact
+        self.precompress: Sequence[str] = precompress
+        # The modification time and digest of each notebook when last looked at
+        self.mtimes: Dict[str, float] = {}
+        self.digests: Dict[str, str] = {}
+        self.failures: Dict[str, _Failure] = {}
+
+    def notebooks(self) -> Iterator[os.DirEntry]:
+        ''' The .ipynb files under the directory, skipping checkpoints '''
+        directories = [self.directory]
+        while directories:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        if entry.name != '.ipynb_checkpoints':
+                            directories.append(entry.path)
+                    elif entry.name.endswith('.ipynb'):
+                        yield entry
+
+    def output_path(self, notebook_path: str) -> str:
+        ''' The path of the published HTML for a notebook '''
+        relative_path = os.path.relpath(notebook_path, self.directory)
+        return os.path.join(self.output_directory,
+                            os.path.splitext(relative_path)[0] + '.html')
+
+    def poll(self) -> List[str]:
+        ''' Look for changed notebooks once and convert them.
+
+        Returns:
+            The paths of the notebooks converted
+        '''
+        now = time.time()
+        converted = []
+        seen = set()
+        for entry in self.notebooks():
+            seen.add(entry.path)
+            mtime = entry.stat().st_mtime
+            failure = self.failures.get(entry.path)
+            if self.mtimes.get(entry.path) == mtime:
+                if failure is None or now < failure.retry_at:
+                    continue
+            elif now - mtime < self.debounce:
+                continue
+            if entry.path not in self.mtimes and self._published(entry.path, mtime):
+                self.mtimes[entry.path] = mtime
+                continue
+            self.mtimes[entry.path] = mtime
+            digest = _digest(entry.path)
+            if self.digests.get(entry.path) == digest:
+                self.failures.pop(entry.path, None)
+                continue
+            attempts = 0
+            if failure is not None and failure.digest == digest:
+                if now < failure.retry_at:
+                    continue
+                attempts = failure.attempts
+            if self.convert(entry.path, retry=attempts > 0):
+                self.digests[entry.path] = digest
+                self.failures.pop(entry.path, None)
+                converted.append(entry.path)
+            else:
+                delay = min(self.interval * 2 ** (attempts + 1), MAX_RETRY_DELAY)
+                self.failures[entry.path] = _Failure(digest, attempts + 1, now + delay)
+        for path in set(self.mtimes) - seen:
+            del self.mtimes[path]
+            self.digests.pop(path, None)
+            self.failures.pop(path, None)
+        return converted
+
+    def _published(self, notebook_path: str, mtime: float) -> bool:
+        ''' Whether the published HTML is newer than the notebook '''
+        try:
+            return os.stat(self.output_path(notebook_path)).st_mtime >= mtime
+        except FileNotFoundError:
+            return False
+
+    def convert(self, notebook_path: str, retry: bool = False) -> bool:
+        ''' Convert one notebook, logging rather than raising any error.
+
+        The time of each stage is logged as JSON at INFO.  Memory isn't
+        traced, since that would slow every conversion down.
+
+        Args:
+            notebook_path: The path of the notebook
+            retry: Whether the same contents have failed before, in which
+                case an error is logged without its traceback
+        '''
+        output_path = self.output_path(notebook_path)
+        logger.info('Converting %s to %s', notebook_path, output_path)
+        metrics = StageMetrics(logger, trace_memory=False)
+        try:
+            stripped_html = convert_notebook(notebook_path, metrics, self.compact)
+            with metrics.stage('write'):
+                os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+                write_html(output_path, stripped_html, self.precompress)
+        except Exception as error: #pylint: disable=broad-except
+            if retry:
+                logger.error('Failed again to convert %s: %r', notebook_path, error)
+            else:
+                logger.exception('Failed to convert %s', notebook_path)
+            return False
+        metrics.emit()
+        return True
+
+    def run(self, polls: int = None) -> None:
+        ''' Poll every interval seconds, forever or for a number of polls '''
+        while polls is None or polls > 0:
+            self.poll()
+            if polls is not None:
+                polls -= 1
+            time.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Republish notebooks when they change')
+    parser.add_argument('directory')
+    parser.add_argument('--output', help='directory for the HTML (default: alongside)')
+    parser.add_argument('--interval', type=float, default=1.0)
+    parser.add_argument('--debounce', type=float, default=2.0)
+    parser.add_argument('--compact', action='store_true')
+    parser.add_argument('--precompress', nargs='*', default=(), choices=['gz', 'br'])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    NotebookWatcher(args.directory, args.output, args.interval, args.debounce,
+                    args.compact, args.precompress).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Tests of book wide numbering with a BookRegistry
+"""
+import json
+
+from jocument import BookRegistry, Citations, Footnotes, merge_usage
+
+
+def _write_notebook(path, sources):
+    cells = [{'cell_type': 'markdown', 'metadata': {}, 'source': source}
+             for source in sources]
+    with open(path, 'wt', encoding='utf-8') as output_file:
+        json.dump({'cells': cells, 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 4},
+                  output_file)
+    return str(path)
+
+
+def _two_chapters(tmp_path):
+    chapters = [_write_notebook(tmp_path / 'chapter1.ipynb',
+                                ['footnotes = Footnotes()\ncitations = Citations()',
+                                 "{{footnotes.ref('a')}} {{citations.cite('x')}}"]),
+                _write_notebook(tmp_path / 'chapter2.ipynb',
+                                ["{{footnotes.ref('b')}} {{citations.cite('y')}}"])]
+    registry = BookRegistry(str(tmp_path / 'book.json'))
+    registry.update(chapters)
+    return registry
+
+
+def test_chapter_outputs_only_its_own_footnotes(tmp_path):
+    registry = _two_chapters(tmp_path)
+    footnotes = Footnotes()
+    footnotes.add('b', 'Note b')
+    footnotes.load_usage(registry.usage('footnotes'))
+    assert 'href=#fn_2>2<' in footnotes.ref('b')
+    output = footnotes.output()
+    assert 'id=fn_2>Note b' in output
+    assert 'fn_1' not in output
+    usage = footnotes.export_usage()
+    assert usage == {'names': ['a', 'b'], 'entries': {'b': 'Note b'}}
+
+
+def test_chapter_outputs_only_its_own_citations(tmp_path):
+    registry = _two_chapters(tmp_path)
+    citations = Citations()
+    citations.reference('y', 'Author', 'Title', 'Source')
+    citations.load_usage(registry.usage('citations'))
+    assert '[2]' in citations.cite('y')
+    for order in ('cite', 'author'):
+        output = citations.output(order)
+        assert 'id=cite_2><strong>Author' in output
+        assert 'cite_1' not in output
+
+
+def test_merge_chapter_logs(tmp_path):
+    registry = _two_chapters(tmp_path)
+    logs = []
+    for name in ('a', 'b'):
+        footnotes = Footnotes()
+        footnotes.add(name, f'Note {name}')
+        footnotes.load_usage(registry.usage('footnotes'))
+        logs.append(footnotes.export_usage())
+    assert merge_usage(logs) == {'names': ['a', 'b'],
+                                 'entries': {'a': 'Note a', 'b': 'Note b'}}
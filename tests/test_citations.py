@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Tests of Citations with fields which aren't strings
+"""
+import pytest
+
+from jocument import Citations, JocumentStyle
+
+
+@pytest.mark.parametrize('escape', [False, True])
+@pytest.mark.parametrize('deduplicate', [False, True])
+def test_non_string_fields(escape, deduplicate):
+    citations = Citations(JocumentStyle(escape=escape), deduplicate=deduplicate)
+    citations.reference('year', 'Author', 'Title', 2001)
+    citations.reference('untitled', 'Author', None, 'Source 1999')
+    citations.reference('authors', ['Kahneman', 'Tversky'], 'Prospect theory', 1979)
+    for name in ('year', 'untitled', 'authors'):
+        citations.cite(name)
+    assert '2001' in citations.output()
+    for order in ('author', 'title', 'year'):
+        output = citations.output(order)
+        assert output.count('<li') == 3
+    assert citations.output('year').index('Prospect') < citations.output('year').index('2001')
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Stress tests of the threadsafe numbering of Footnotes, Citations and Labels
+"""
+import random
+import sys
+import threading
+
+import pytest
+
+from jocument import Citations, Footnotes, Labels
+
+THREADS = 16
+NAMES = 500
+
+
+@pytest.fixture(autouse=True)
+def _switch_often():
+    ''' Switch threads as often as possible to provoke races '''
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _hammer(call):
+    ''' Call call(name) for every name from each of THREADS threads, each in a
+        different order, all starting together
+    '''
+    barrier = threading.Barrier(THREADS)
+    errors = []
+
+    def work(seed):
+        names = [f'name_{index}' for index in range(NAMES)]
+        random.Random(seed).shuffle(names)
+        barrier.wait()
+        try:
+            for name in names:
+                call(name)
+        except Exception as error: #pylint: disable=broad-except
+            errors.append(error)
+
+    threads = [threading.Thread(target=work, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def _assert_numbered_once(references):
+    assert len(references.names) == NAMES
+    assert len(set(references.names)) == NAMES
+    assert [references._numbers[name] for name in references.names] == \
+        list(range(1, NAMES + 1)) #pylint: disable=protected-access
+
+
+def test_footnotes_ref():
+    footnotes = Footnotes(threadsafe=True)
+    for index in range(NAMES):
+        footnotes.add(f'name_{index}', f'Note {index}')
+    _hammer(footnotes.ref)
+    _assert_numbered_once(footnotes)
+
+
+def test_footnotes_num():
+    footnotes = Footnotes(threadsafe=True)
+    for index in range(NAMES):
+        footnotes.add(f'name_{index}', f'Note {index}')
+    _hammer(footnotes.num)
+    _assert_numbered_once(footnotes)
+
+
+def test_citations_cite():
+    citations = Citations(threadsafe=True)
+    for index in range(NAMES):
+        citations.reference(f'name_{index}', f'Author {index}', 'Title', 'Source')
+    _hammer(citations.cite)
+    _assert_numbered_once(citations)
+
+
+def test_labels_add():
+    labels = Labels('Figure', threadsafe=True)
+    _hammer(lambda name: labels.add(name, 'Title'))
+    _assert_numbered_once(labels)